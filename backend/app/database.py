@@ -1,27 +1,47 @@
 """
 Database configuration and session management
 """
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
-from app.config import get_settings
+from sqlalchemy import create_engine, insert
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import declarative_base
+from app.config import settings
 
-settings = get_settings()
+# Async engine (asyncpg) used by all request handlers
+engine = create_async_engine(
+    settings.database_url,
+    echo=settings.sql_echo,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_recycle=settings.db_pool_recycle,
+)
 
-# Sync engine for table creation
-engine = create_engine(
+# Sync engine for table creation at startup only
+sync_engine = create_engine(
     settings.database_url_sync,
-    echo=settings.debug,
+    echo=settings.sql_echo,
 )
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = async_sessionmaker(
+    engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
 
 Base = declarative_base()
 
+# Rows per INSERT statement for bulk loads (~10 columns each keeps a page
+# well under PostgreSQL's 65535 bind-parameter limit)
+INSERT_BATCH_SIZE = 5000
+
 
-def get_db():
+async def get_db():
     """Dependency for database session"""
-    db = SessionLocal()
-    try:
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+
+async def bulk_insert(db: AsyncSession, model, rows: list, batch_size: int = INSERT_BATCH_SIZE):
+    """Insert plain row dicts for a model in fixed-size pages"""
+    for start in range(0, len(rows), batch_size):
+        await db.execute(insert(model), rows[start:start + batch_size])
@@ -0,0 +1,19 @@
+"""
+Shared FastAPI dependencies
+"""
+from uuid import UUID
+
+from fastapi import Depends, HTTPException
+from sqlalchemy import select, exists
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import get_db
+from app.models import ChatSession
+
+
+async def require_session_id(session_id: UUID, db: AsyncSession = Depends(get_db)) -> UUID:
+    """Ensure the session exists with a primary-key EXISTS probe, not a row fetch"""
+    found = await db.scalar(select(exists().where(ChatSession.id == session_id)))
+    if not found:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return session_id
@@ -2,8 +2,7 @@
 Gap model - detected deletion or suspicious break in conversation
 """
 import uuid
-from datetime import datetime
-from sqlalchemy import Column, String, DateTime, Text, Integer, Float, ForeignKey
+from sqlalchemy import Column, String, DateTime, Text, Integer, Float, ForeignKey, Index, func
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from app.database import Base
@@ -13,9 +12,17 @@ class Gap(Base):
     """Represents a detected gap/deletion in the chat conversation"""
     
     __tablename__ = "gaps"
+    __table_args__ = (
+        Index("idx_gaps_session_seq", "session_id", "before_message_seq"),
+        Index("idx_gaps_suspicion", "session_id", "suspicion_score"),
+    )
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    session_id = Column(UUID(as_uuid=True), ForeignKey("chat_sessions.id"), nullable=False)
+    session_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("chat_sessions.id", ondelete="CASCADE"),
+        nullable=False,
+    )
     
     # Position in conversation
     before_message_seq = Column(Integer, nullable=False)
@@ -37,8 +44,13 @@ class Gap(Base):
     context_before = Column(Text, nullable=True)  # Messages before gap
     context_after = Column(Text, nullable=True)   # Messages after gap
     
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, server_default=func.timezone("utc", func.now()))
     
     # Relationships
     session = relationship("ChatSession", back_populates="gaps")
-    inferences = relationship("Inference", back_populates="gap", cascade="all, delete-orphan")
+    inferences = relationship(
+        "Inference",
+        back_populates="gap",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
@@ -2,8 +2,7 @@
 Inference model - AI-generated predictions for detected gaps
 """
 import uuid
-from datetime import datetime
-from sqlalchemy import Column, String, DateTime, Text, Float, ForeignKey
+from sqlalchemy import Column, String, DateTime, Text, Float, ForeignKey, Index, func
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from app.database import Base
@@ -13,9 +12,17 @@ class Inference(Base):
     """AI-generated inference/prediction for a detected gap"""
     
     __tablename__ = "inferences"
+    __table_args__ = (
+        Index("idx_inferences_gap", "gap_id"),
+        Index("idx_inferences_confidence", "confidence_score"),
+    )
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    gap_id = Column(UUID(as_uuid=True), ForeignKey("gaps.id"), nullable=False)
+    gap_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("gaps.id", ondelete="CASCADE"),
+        nullable=False,
+    )
     
     # Inference content
     predicted_intent = Column(Text, nullable=False)  # What was likely discussed
@@ -34,7 +41,7 @@ class Inference(Base):
     hallucination_flags = Column(Text, nullable=True)  # JSON: potential issues
     verified = Column(String(20), default="pending")  # pending, accepted, rejected
     
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, server_default=func.timezone("utc", func.now()))
     
     # Relationships
     gap = relationship("Gap", back_populates="inferences")
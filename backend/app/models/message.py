@@ -1,9 +1,7 @@
 """
 Message model - individual chat message with metadata
 """
-import uuid
-from datetime import datetime
-from sqlalchemy import Column, String, DateTime, Text, Integer, Boolean, ForeignKey
+from sqlalchemy import Column, String, DateTime, Text, Integer, Boolean, ForeignKey, Index, func
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from app.database import Base
@@ -13,9 +11,25 @@ class Message(Base):
     """Represents an individual message within a chat session"""
     
     __tablename__ = "messages"
-    
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    session_id = Column(UUID(as_uuid=True), ForeignKey("chat_sessions.id"), nullable=False)
+    __table_args__ = (
+        # Matches database/schema.sql; serves the per-session, in-order scans
+        Index("idx_messages_session_seq", "session_id", "sequence_number"),
+        # Covering index so per-sender stats are an index-only scan
+        Index(
+            "idx_messages_session_stats",
+            "session_id",
+            "sender",
+            postgresql_include=["is_deleted", "has_media"],
+        ),
+    )
+    
+    # Generated by PostgreSQL: message IDs are never needed before insert
+    id = Column(UUID(as_uuid=True), primary_key=True, server_default=func.gen_random_uuid())
+    session_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("chat_sessions.id", ondelete="CASCADE"),
+        nullable=False,
+    )
     
     # Message content
     sender = Column(String(255), nullable=False)
@@ -34,7 +48,7 @@ class Message(Base):
     has_media = Column(Boolean, default=False)
     reply_to_sequence = Column(Integer, nullable=True)
     
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, server_default=func.timezone("utc", func.now()))
     
     # Relationships
     session = relationship("ChatSession", back_populates="messages")
@@ -2,8 +2,7 @@
 ChatSession model - represents an imported chat conversation
 """
 import uuid
-from datetime import datetime
-from sqlalchemy import Column, String, DateTime, Text, Integer
+from sqlalchemy import Column, String, DateTime, Text, Integer, func
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from app.database import Base
@@ -30,9 +29,24 @@ class ChatSession(Base):
     status = Column(String(50), default="pending")  # pending, processing, analyzed, error
     error_message = Column(Text, nullable=True)
     
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, server_default=func.timezone("utc", func.now()))
+    updated_at = Column(
+        DateTime,
+        server_default=func.timezone("utc", func.now()),
+        onupdate=func.timezone("utc", func.now()),
+    )
     
     # Relationships
-    messages = relationship("Message", back_populates="session", cascade="all, delete-orphan")
-    gaps = relationship("Gap", back_populates="session", cascade="all, delete-orphan")
+    messages = relationship(
+        "Message",
+        back_populates="session",
+        order_by="Message.sequence_number",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
+    gaps = relationship(
+        "Gap",
+        back_populates="session",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
@@ -1,26 +1,35 @@
 """
 Analysis Router - API endpoints for gap detection and AI inference
 """
-import json
+import uuid
 from uuid import UUID
 from typing import List, Optional
 from dataclasses import asdict
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+import orjson
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, delete, exists, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 
-from app.database import get_db
+from app.database import SessionLocal, get_db, bulk_insert
+from app.dependencies import require_session_id
 from app.models import ChatSession, Message, Gap, Inference
 from app.services.parser import ParsedMessage
-from app.services.gap_detector import GapDetector
+from app.services.gap_detector import GapDetector, DetectedGap
 from app.services.metadata_engine import MetadataEngine
-from app.services.ai_inferencer import AIInferencer
+from app.services.ai_inferencer import InferenceResult, get_inferencer
 
 
 router = APIRouter()
 
 
+def _dumps(value) -> str:
+    """Serialize a JSON column value (orjson is several times faster than json)"""
+    return orjson.dumps(value).decode()
+
+
 # Pydantic Schemas
 class GapResponse(BaseModel):
     id: UUID
@@ -51,24 +60,30 @@ class InferenceResponse(BaseModel):
         from_attributes = True
 
 
-class AnalysisResultResponse(BaseModel):
+class AnalysisQueuedResponse(BaseModel):
     session_id: UUID
-    gaps_detected: int
-    inferences_generated: int
-    high_priority_gaps: int
-    gaps: List[GapResponse]
+    status: str
     
 
 # Endpoints
-@router.post("/sessions/{session_id}/analyze", response_model=AnalysisResultResponse)
+@router.post(
+    "/sessions/{session_id}/analyze",
+    response_model=AnalysisQueuedResponse,
+    status_code=202,
+)
 async def analyze_session(
     session_id: UUID,
+    background_tasks: BackgroundTasks,
     min_suspicion: float = 0.0,
     generate_inferences: bool = True,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
-    Analyze a chat session for gaps and generate AI inferences
+    Queue gap detection and AI inference for a chat session
+    
+    Returns 202 immediately; poll GET /sessions/{session_id}/status until the
+    status changes from "processing" to "analyzed" (or "error"). Returns 409
+    while a previous run for the session is still processing.
     
     Args:
         session_id: The session to analyze
@@ -76,143 +91,180 @@ async def analyze_session(
         generate_inferences: Whether to generate AI predictions for gaps
     """
     # Get session
-    session = db.query(ChatSession).filter(ChatSession.id == session_id).first()
+    session = await db.get(ChatSession, session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    # Update status
-    session.status = "processing"
-    db.commit()
+    has_messages = await db.scalar(
+        select(exists().where(Message.session_id == session_id))
+    )
+    if not has_messages:
+        raise HTTPException(status_code=400, detail="No messages in session")
     
-    try:
-        # Get all messages
-        messages = db.query(Message)\
-            .filter(Message.session_id == session_id)\
-            .order_by(Message.sequence_number)\
-            .all()
-        
-        if not messages:
-            raise HTTPException(status_code=400, detail="No messages in session")
+    # Claim the session with a conditional UPDATE, so concurrent requests
+    # cannot queue two runs that replace the same gaps and inferences
+    claimed = await db.execute(
+        update(ChatSession)
+        .where(ChatSession.id == session_id, ChatSession.status != "processing")
+        .values(status="processing", error_message=None)
+    )
+    await db.commit()
+    if claimed.rowcount == 0:
+        raise HTTPException(status_code=409, detail="Analysis already in progress")
+    
+    background_tasks.add_task(_run_analysis, session_id, min_suspicion, generate_inferences)
+    
+    return AnalysisQueuedResponse(session_id=session_id, status="processing")
+
+
+async def _run_analysis(session_id: UUID, min_suspicion: float, generate_inferences: bool):
+    """
+    Detect gaps and generate inferences for a queued session
+    
+    Runs after the response has been sent, so it opens its own database
+    session and records the outcome on the ChatSession row.
+    """
+    async with SessionLocal() as db:
+        session = await db.get(ChatSession, session_id)
+        if not session:
+            return  # Deleted while queued
         
-        # Convert to ParsedMessage for analysis
-        parsed_messages = [
-            ParsedMessage(
-                timestamp=m.timestamp,
-                sender=m.sender,
-                content=m.content or "",
-                sequence_number=m.sequence_number,
-                message_type=m.message_type,
-                is_deleted=m.is_deleted,
-                has_media=m.has_media,
+        try:
+            # Get all messages
+            result = await db.execute(
+                select(Message)
+                .where(Message.session_id == session_id)
+                .order_by(Message.sequence_number)
             )
-            for m in messages
-        ]
-        
-        # Run gap detection
-        detector = GapDetector(parsed_messages)
-        detected_gaps = detector.detect_all()
-        
-        # Filter by suspicion score
-        filtered_gaps = [g for g in detected_gaps if g.suspicion_score >= min_suspicion]
-        
-        # Clear existing gaps and inferences
-        db.query(Gap).filter(Gap.session_id == session_id).delete()
-        db.commit()
-        
-        # Store gaps in database
-        gap_records = []
-        for dg in filtered_gaps:
-            gap = Gap(
-                session_id=session_id,
-                before_message_seq=dg.before_seq,
-                after_message_seq=dg.after_seq,
-                time_gap_seconds=dg.time_gap_seconds,
-                detection_type=dg.detection_type,
-                suspicion_score=dg.suspicion_score,
-                suspicion_reasons=json.dumps(dg.suspicion_reasons),
-                expected_messages=dg.estimated_missing,
-                context_before=json.dumps(dg.context_before),
-                context_after=json.dumps(dg.context_after),
+            messages = result.scalars().all()
+            
+            # Convert to ParsedMessage for analysis
+            parsed_messages = [
+                ParsedMessage(
+                    timestamp=m.timestamp,
+                    sender=m.sender,
+                    content=m.content or "",
+                    sequence_number=m.sequence_number,
+                    message_type=m.message_type,
+                    is_deleted=m.is_deleted,
+                    has_media=m.has_media,
+                )
+                for m in messages
+            ]
+            
+            # Run gap detection
+            detector = GapDetector(parsed_messages)
+            detected_gaps = detector.detect_all()
+            
+            # Filter by suspicion score
+            filtered_gaps = [g for g in detected_gaps if g.suspicion_score >= min_suspicion]
+            
+            # Clear existing gaps and inferences
+            # (no identity-map sync needed: the deleted rows are never read back)
+            await db.execute(
+                delete(Gap)
+                .where(Gap.session_id == session_id)
+                .execution_options(synchronize_session=False)
             )
-            db.add(gap)
-            db.flush()
-            gap_records.append(gap)
-        
-        # Generate AI inferences if requested
-        inference_count = 0
-        if generate_inferences and filtered_gaps:
-            inferencer = AIInferencer()
             
-            for gap_record, detected_gap in zip(gap_records, filtered_gaps):
-                result = inferencer.analyze_gap(detected_gap)
+            # Store gaps in database
+            # IDs are generated up-front so inferences can reference them
+            # without flushing each gap individually
+            gap_rows = [
+                {
+                    "id": uuid.uuid4(),
+                    "session_id": session_id,
+                    "before_message_seq": dg.before_seq,
+                    "after_message_seq": dg.after_seq,
+                    "time_gap_seconds": dg.time_gap_seconds,
+                    "detection_type": dg.detection_type,
+                    "suspicion_score": dg.suspicion_score,
+                    "suspicion_reasons": _dumps(dg.suspicion_reasons),
+                    "expected_messages": dg.estimated_missing,
+                    "context_before": _dumps(dg.context_before),
+                    "context_after": _dumps(dg.context_after),
+                }
+                for dg in filtered_gaps
+            ]
+            await bulk_insert(db, Gap, gap_rows)
+            
+            # Generate AI inferences if requested
+            inference_rows = []
+            if generate_inferences and filtered_gaps:
+                # The transcript is preloaded once; each gap request then only
+                # sends its own context, concurrently within API rate limits
+                full_context = [
+                    {
+                        "sequence": m.sequence_number,
+                        "sender": m.sender,
+                        "content": m.content,
+                        "timestamp": m.timestamp.isoformat(),
+                    }
+                    for m in parsed_messages
+                ]
+                async with get_inferencer().open_transcript(full_context) as transcript:
+                    results = await transcript.analyze_multiple_gaps_async(filtered_gaps)
                 
-                inference = Inference(
-                    gap_id=gap_record.id,
-                    predicted_intent=result.predicted_intent,
-                    predicted_content=result.predicted_content,
-                    predicted_sender=result.predicted_sender,
-                    confidence_score=result.confidence_score,
-                    context_anchors=json.dumps(result.context_anchors),
-                    model_used=result.model_used,
-                    reasoning=result.reasoning,
-                    hallucination_flags=json.dumps(result.hallucination_flags),
-                )
-                db.add(inference)
-                inference_count += 1
-        
-        # Update session status
-        session.status = "analyzed"
-        session.detected_gaps = len(gap_records)
-        db.commit()
-        
-        # Build response
-        high_priority = sum(1 for g in filtered_gaps if g.suspicion_score >= 0.5)
-        
-        return AnalysisResultResponse(
-            session_id=session_id,
-            gaps_detected=len(gap_records),
-            inferences_generated=inference_count,
-            high_priority_gaps=high_priority,
-            gaps=[GapResponse.model_validate(g) for g in gap_records],
-        )
+                for gap_row, result in zip(gap_rows, results):
+                    inference_rows.append({
+                        "id": uuid.uuid4(),
+                        "gap_id": gap_row["id"],
+                        "predicted_intent": result.predicted_intent,
+                        "predicted_content": result.predicted_content,
+                        "predicted_sender": result.predicted_sender,
+                        "confidence_score": result.confidence_score,
+                        "context_anchors": _dumps(result.context_anchors),
+                        "model_used": result.model_used,
+                        "reasoning": result.reasoning,
+                        "hallucination_flags": _dumps(result.hallucination_flags),
+                    })
+                
+                await bulk_insert(db, Inference, inference_rows)
+            
+            # Update session status
+            session.status = "analyzed"
+            session.detected_gaps = len(gap_rows)
+            await db.commit()
         
-    except Exception as e:
-        session.status = "error"
-        session.error_message = str(e)
-        db.commit()
-        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+        except Exception as e:
+            # Discard the partial analysis, then record the failure on its own
+            await db.rollback()
+            session.status = "error"
+            session.error_message = str(e)
+            await db.commit()
 
 
 @router.get("/sessions/{session_id}/gaps", response_model=List[GapResponse])
 async def get_gaps(
-    session_id: UUID,
+    session_id: UUID = Depends(require_session_id),
     min_suspicion: float = 0.0,
     detection_type: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get detected gaps for a session"""
-    query = db.query(Gap).filter(Gap.session_id == session_id)
+    query = select(Gap).where(Gap.session_id == session_id)
     
     if min_suspicion > 0:
-        query = query.filter(Gap.suspicion_score >= min_suspicion)
+        query = query.where(Gap.suspicion_score >= min_suspicion)
     
     if detection_type:
-        query = query.filter(Gap.detection_type == detection_type)
+        query = query.where(Gap.detection_type == detection_type)
     
-    gaps = query.order_by(Gap.before_message_seq).all()
-    return gaps
+    result = await db.execute(query.order_by(Gap.before_message_seq))
+    return result.scalars().all()
 
 
 @router.get("/sessions/{session_id}/gaps/{gap_id}", response_model=GapResponse)
 async def get_gap_detail(
-    session_id: UUID,
     gap_id: UUID,
-    db: Session = Depends(get_db)
+    session_id: UUID = Depends(require_session_id),
+    db: AsyncSession = Depends(get_db)
 ):
     """Get details for a specific gap"""
-    gap = db.query(Gap)\
-        .filter(Gap.session_id == session_id, Gap.id == gap_id)\
-        .first()
+    result = await db.execute(
+        select(Gap).where(Gap.session_id == session_id, Gap.id == gap_id)
+    )
+    gap = result.scalar_one_or_none()
     
     if not gap:
         raise HTTPException(status_code=404, detail="Gap not found")
@@ -222,35 +274,37 @@ async def get_gap_detail(
 
 @router.get("/sessions/{session_id}/inferences", response_model=List[InferenceResponse])
 async def get_inferences(
-    session_id: UUID,
+    session_id: UUID = Depends(require_session_id),
     min_confidence: float = 0.0,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get AI inferences for a session's gaps"""
-    # Get gap IDs for this session
-    gap_ids = db.query(Gap.id).filter(Gap.session_id == session_id).all()
-    gap_ids = [g[0] for g in gap_ids]
-    
-    if not gap_ids:
-        return []
-    
-    query = db.query(Inference).filter(Inference.gap_id.in_(gap_ids))
+    # Join through gaps so the session filter stays in a single query
+    query = select(Inference)\
+        .join(Gap, Inference.gap_id == Gap.id)\
+        .where(Gap.session_id == session_id)
     
     if min_confidence > 0:
-        query = query.filter(Inference.confidence_score >= min_confidence)
+        query = query.where(Inference.confidence_score >= min_confidence)
     
-    inferences = query.all()
-    return inferences
+    result = await db.execute(query)
+    return result.scalars().all()
 
 
 @router.get("/sessions/{session_id}/gaps/{gap_id}/inference", response_model=InferenceResponse)
 async def get_gap_inference(
-    session_id: UUID,
     gap_id: UUID,
-    db: Session = Depends(get_db)
+    session_id: UUID = Depends(require_session_id),
+    db: AsyncSession = Depends(get_db)
 ):
     """Get AI inference for a specific gap"""
-    inference = db.query(Inference).filter(Inference.gap_id == gap_id).first()
+    # Join through the gap so an inference is only found under its own session
+    result = await db.execute(
+        select(Inference)
+        .join(Gap, Inference.gap_id == Gap.id)
+        .where(Gap.session_id == session_id, Inference.gap_id == gap_id)
+    )
+    inference = result.scalars().first()
     
     if not inference:
         raise HTTPException(status_code=404, detail="Inference not found")
@@ -260,24 +314,70 @@ async def get_gap_inference(
 
 @router.post("/sessions/{session_id}/gaps/{gap_id}/regenerate", response_model=InferenceResponse)
 async def regenerate_inference(
-    session_id: UUID,
     gap_id: UUID,
-    db: Session = Depends(get_db)
+    session_id: UUID = Depends(require_session_id),
+    db: AsyncSession = Depends(get_db)
 ):
     """Regenerate AI inference for a specific gap"""
-    gap = db.query(Gap)\
-        .filter(Gap.session_id == session_id, Gap.id == gap_id)\
-        .first()
+    detected_gap = _detected_gap(await _get_gap(db, session_id, gap_id))
+    
+    # Generate new inference
+    inferencer = get_inferencer()
+    result = await inferencer.analyze_gap_async(detected_gap)
+    
+    return await _replace_inference(db, gap_id, result)
+
+
+@router.post("/sessions/{session_id}/gaps/{gap_id}/regenerate/stream")
+async def regenerate_inference_stream(
+    gap_id: UUID,
+    session_id: UUID = Depends(require_session_id),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Regenerate AI inference for a gap, streamed as Server-Sent Events
+    
+    Each "partial" event carries the fields completed so far (flagged
+    PARTIAL_RESULT); the closing "final" event carries the stored
+    inference, which replaces the previous one.
+    """
+    detected_gap = _detected_gap(await _get_gap(db, session_id, gap_id))
+    
+    async def events():
+        result = None
+        async for result in get_inferencer().analyze_gap_stream(detected_gap):
+            if "PARTIAL_RESULT" in result.hallucination_flags:
+                yield _sse("partial", result.to_dict())
+        
+        # The request's session may already be closed while streaming
+        async with SessionLocal() as stream_db:
+            inference = await _replace_inference(stream_db, gap_id, result)
+            yield _sse("final", InferenceResponse.model_validate(inference).model_dump(mode="json"))
+    
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def _sse(event: str, data: dict) -> str:
+    """One Server-Sent Events message"""
+    return f"event: {event}\ndata: {_dumps(data)}\n\n"
+
+
+async def _get_gap(db: AsyncSession, session_id: UUID, gap_id: UUID) -> Gap:
+    """Gap of a session, or 404"""
+    result = await db.execute(
+        select(Gap).where(Gap.session_id == session_id, Gap.id == gap_id)
+    )
+    gap = result.scalar_one_or_none()
     
     if not gap:
         raise HTTPException(status_code=404, detail="Gap not found")
     
-    # Delete existing inference
-    db.query(Inference).filter(Inference.gap_id == gap_id).delete()
-    
-    # Convert to DetectedGap
-    from app.services.gap_detector import DetectedGap
-    detected_gap = DetectedGap(
+    return gap
+
+
+def _detected_gap(gap: Gap) -> DetectedGap:
+    """Rebuild the detector's view of a stored gap for inference"""
+    return DetectedGap(
         before_seq=gap.before_message_seq,
         after_seq=gap.after_message_seq,
         before_timestamp=None,  # Not needed for inference
@@ -285,15 +385,20 @@ async def regenerate_inference(
         time_gap_seconds=gap.time_gap_seconds,
         detection_type=gap.detection_type,
         suspicion_score=gap.suspicion_score,
-        suspicion_reasons=json.loads(gap.suspicion_reasons) if gap.suspicion_reasons else [],
-        context_before=json.loads(gap.context_before) if gap.context_before else [],
-        context_after=json.loads(gap.context_after) if gap.context_after else [],
+        suspicion_reasons=orjson.loads(gap.suspicion_reasons) if gap.suspicion_reasons else [],
+        context_before=orjson.loads(gap.context_before) if gap.context_before else [],
+        context_after=orjson.loads(gap.context_after) if gap.context_after else [],
         estimated_missing=gap.expected_messages,
     )
-    
-    # Generate new inference
-    inferencer = AIInferencer()
-    result = inferencer.analyze_gap(detected_gap)
+
+
+async def _replace_inference(db: AsyncSession, gap_id: UUID, result: InferenceResult) -> Inference:
+    """Store a gap's new inference in place of the existing one"""
+    await db.execute(
+        delete(Inference)
+        .where(Inference.gap_id == gap_id)
+        .execution_options(synchronize_session=False)
+    )
     
     inference = Inference(
         gap_id=gap_id,
@@ -301,25 +406,30 @@ async def regenerate_inference(
         predicted_content=result.predicted_content,
         predicted_sender=result.predicted_sender,
         confidence_score=result.confidence_score,
-        context_anchors=json.dumps(result.context_anchors),
+        context_anchors=_dumps(result.context_anchors),
         model_used=result.model_used,
         reasoning=result.reasoning,
-        hallucination_flags=json.dumps(result.hallucination_flags),
+        hallucination_flags=_dumps(result.hallucination_flags),
     )
     db.add(inference)
-    db.commit()
-    db.refresh(inference)
+    await db.commit()
+    await db.refresh(inference)
     
     return inference
 
 
 @router.get("/sessions/{session_id}/metadata")
-async def get_metadata_analysis(session_id: UUID, db: Session = Depends(get_db)):
+async def get_metadata_analysis(
+    session_id: UUID = Depends(require_session_id),
+    db: AsyncSession = Depends(get_db)
+):
     """Get metadata analysis for a session"""
-    messages = db.query(Message)\
-        .filter(Message.session_id == session_id)\
-        .order_by(Message.sequence_number)\
-        .all()
+    result = await db.execute(
+        select(Message)
+        .where(Message.session_id == session_id)
+        .order_by(Message.sequence_number)
+    )
+    messages = result.scalars().all()
     
     if not messages:
         raise HTTPException(status_code=404, detail="No messages found")
@@ -352,5 +462,5 @@ async def get_metadata_analysis(session_id: UUID, db: Session = Depends(get_db))
 @router.get("/model/info")
 async def get_model_info():
     """Get information about the currently configured AI model"""
-    inferencer = AIInferencer()
+    inferencer = get_inferencer()
     return inferencer.get_model_info()
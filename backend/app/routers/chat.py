@@ -1,18 +1,21 @@
 """
 Chat Router - API endpoints for chat session management
 """
-import json
 from uuid import UUID
 from typing import List, Optional
 from datetime import datetime
 
+import orjson
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from sqlalchemy.orm import Session
+from sqlalchemy import select, delete, func, cast, Integer
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from pydantic import BaseModel
 
-from app.database import get_db
+from app.database import get_db, bulk_insert, INSERT_BATCH_SIZE
+from app.dependencies import require_session_id
 from app.models import ChatSession, Message
-from app.services.parser import WhatsAppParser
+from app.services.parser import WhatsAppParser, iter_decoded_chunks
 
 
 router = APIRouter()
@@ -42,6 +45,7 @@ class SessionResponse(BaseModel):
     name: str
     source_format: str
     status: str
+    error_message: Optional[str] = None
     total_messages: int
     detected_gaps: int
     participants: Optional[str]
@@ -62,40 +66,48 @@ class SessionDetailResponse(SessionResponse):
 async def list_sessions(
     skip: int = 0,
     limit: int = 20,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """List all chat sessions"""
-    sessions = db.query(ChatSession)\
-        .order_by(ChatSession.created_at.desc())\
-        .offset(skip)\
-        .limit(limit)\
-        .all()
-    return sessions
+    result = await db.execute(
+        select(ChatSession)
+        .order_by(ChatSession.created_at.desc())
+        .offset(skip)
+        .limit(limit)
+    )
+    return result.scalars().all()
 
 
 @router.get("/sessions/{session_id}", response_model=SessionDetailResponse)
-async def get_session(session_id: UUID, db: Session = Depends(get_db)):
+async def get_session(session_id: UUID, db: AsyncSession = Depends(get_db)):
     """Get a specific session with all messages"""
-    session = db.query(ChatSession).filter(ChatSession.id == session_id).first()
+    result = await db.execute(
+        select(ChatSession)
+        .options(selectinload(ChatSession.messages))
+        .where(ChatSession.id == session_id)
+    )
+    session = result.scalar_one_or_none()
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    messages = db.query(Message)\
-        .filter(Message.session_id == session_id)\
-        .order_by(Message.sequence_number)\
-        .all()
+    return SessionDetailResponse.model_validate(session)
+
+
+@router.get("/sessions/{session_id}/status", response_model=SessionResponse)
+async def get_session_status(session_id: UUID, db: AsyncSession = Depends(get_db)):
+    """Get a session's status and counters without its messages (for polling)"""
+    session = await db.get(ChatSession, session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
     
-    return SessionDetailResponse(
-        **{c.name: getattr(session, c.name) for c in session.__table__.columns},
-        messages=[MessageResponse.model_validate(m) for m in messages]
-    )
+    return session
 
 
 @router.post("/sessions/upload", response_model=SessionResponse)
 async def upload_chat(
     file: UploadFile = File(...),
     name: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Upload a WhatsApp chat export file for analysis
@@ -110,129 +122,158 @@ async def upload_chat(
             detail="Only .txt files are supported. Export your chat from WhatsApp."
         )
     
-    # Read file content
-    content = await file.read()
-    try:
-        text_content = content.decode('utf-8')
-    except UnicodeDecodeError:
+    # Stream the upload through the parser page by page instead of holding
+    # the raw bytes, the decoded text and every parsed message at once
+    for encoding in ("utf-8", "utf-16"):
+        await file.seek(0)
         try:
-            text_content = content.decode('utf-16')
+            session = await _import_chat(db, file, encoding, name)
+            break
         except UnicodeDecodeError:
-            raise HTTPException(status_code=400, detail="Unable to decode file")
+            # Discard anything inserted before the decode error and retry
+            await db.rollback()
+    else:
+        raise HTTPException(status_code=400, detail="Unable to decode file")
     
-    # Parse the chat
-    parser = WhatsAppParser()
-    parsed_messages = parser.parse(text_content)
-    
-    if not parsed_messages:
+    if session is None:
+        await db.rollback()
         raise HTTPException(
             status_code=400, 
             detail="No messages could be parsed from the file"
         )
     
-    # Get metadata
-    participants = parser.get_participants()
-    start_ts, end_ts = parser.get_time_range()
-    stats = parser.get_stats()
+    await db.commit()
+    await db.refresh(session)
     
-    # Create session
+    return session
+
+
+async def _import_chat(
+    db: AsyncSession,
+    file: UploadFile,
+    encoding: str,
+    name: Optional[str],
+) -> Optional[ChatSession]:
+    """
+    Decode, parse and insert an uploaded export in INSERT_BATCH_SIZE pages
+    
+    Returns the new session, or None if no messages could be parsed.
+    """
+    parser = WhatsAppParser()
+    
+    # Create session first so message pages can reference it
     session = ChatSession(
         name=name or file.filename,
         source_format="whatsapp",
         source_filename=file.filename,
-        participants=json.dumps(participants),
-        start_timestamp=start_ts,
-        end_timestamp=end_ts,
-        total_messages=stats["total_messages"],
         status="imported",
     )
     db.add(session)
-    db.flush()  # Get the session ID
-    
-    # Create messages
-    for pm in parsed_messages:
-        message = Message(
-            session_id=session.id,
-            sender=pm.sender,
-            content=pm.content,
-            timestamp=pm.timestamp,
-            sequence_number=pm.sequence_number,
-            message_type=pm.message_type,
-            is_deleted=pm.is_deleted,
-            has_media=pm.has_media,
-            word_count=len(pm.content.split()) if pm.content else 0,
-        )
-        db.add(message)
+    await db.flush()  # Get the session ID
+    
+    rows = []
+    for pm in parser.parse_iter(iter_decoded_chunks(file.file, encoding)):
+        rows.append({
+            "session_id": session.id,
+            "sender": pm.sender,
+            "content": pm.content,
+            "timestamp": pm.timestamp,
+            "sequence_number": pm.sequence_number,
+            "message_type": pm.message_type,
+            "is_deleted": pm.is_deleted,
+            "has_media": pm.has_media,
+            "word_count": len(pm.content.split()) if pm.content else 0,
+        })
+        if len(rows) >= INSERT_BATCH_SIZE:
+            await bulk_insert(db, Message, rows)
+            rows = []
+    await bulk_insert(db, Message, rows)
+    
+    if not parser.message_count:
+        return None
     
-    db.commit()
-    db.refresh(session)
+    # Metadata gathered while streaming
+    start_ts, end_ts = parser.get_time_range()
+    session.participants = orjson.dumps(parser.get_participants()).decode()
+    session.start_timestamp = start_ts
+    session.end_timestamp = end_ts
+    session.total_messages = parser.get_stats()["total_messages"]
     
     return session
 
 
 @router.delete("/sessions/{session_id}")
-async def delete_session(session_id: UUID, db: Session = Depends(get_db)):
+async def delete_session(session_id: UUID, db: AsyncSession = Depends(get_db)):
     """Delete a chat session and all related data"""
-    session = db.query(ChatSession).filter(ChatSession.id == session_id).first()
-    if not session:
+    # Messages, gaps and inferences go with it via ON DELETE CASCADE
+    result = await db.execute(delete(ChatSession).where(ChatSession.id == session_id))
+    if not result.rowcount:
         raise HTTPException(status_code=404, detail="Session not found")
-    
-    db.delete(session)
-    db.commit()
+    await db.commit()
     
     return {"message": "Session deleted successfully"}
 
 
 @router.get("/sessions/{session_id}/messages", response_model=List[MessageResponse])
 async def get_messages(
-    session_id: UUID,
+    session_id: UUID = Depends(require_session_id),
     skip: int = 0,
     limit: int = 100,
     sender: Optional[str] = None,
     include_deleted: bool = True,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get messages from a session with optional filtering"""
-    query = db.query(Message).filter(Message.session_id == session_id)
+    query = select(Message).where(Message.session_id == session_id)
     
     if sender:
-        query = query.filter(Message.sender == sender)
+        query = query.where(Message.sender == sender)
     
     if not include_deleted:
-        query = query.filter(Message.is_deleted == False)
+        query = query.where(Message.is_deleted == False)
     
-    messages = query\
-        .order_by(Message.sequence_number)\
-        .offset(skip)\
-        .limit(limit)\
-        .all()
+    result = await db.execute(
+        query
+        .order_by(Message.sequence_number)
+        .offset(skip)
+        .limit(limit)
+    )
     
-    return messages
+    return result.scalars().all()
 
 
 @router.get("/sessions/{session_id}/stats")
-async def get_session_stats(session_id: UUID, db: Session = Depends(get_db)):
+async def get_session_stats(session_id: UUID, db: AsyncSession = Depends(get_db)):
     """Get statistics for a chat session"""
-    session = db.query(ChatSession).filter(ChatSession.id == session_id).first()
+    # Only the date range is needed from the session row
+    result = await db.execute(
+        select(ChatSession.start_timestamp, ChatSession.end_timestamp)
+        .where(ChatSession.id == session_id)
+    )
+    session = result.one_or_none()
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    messages = db.query(Message).filter(Message.session_id == session_id).all()
+    # Aggregate per sender in the database instead of loading every row
+    result = await db.execute(
+        select(
+            Message.sender,
+            func.count().label("count"),
+            func.coalesce(func.sum(cast(Message.is_deleted, Integer)), 0).label("deleted"),
+            func.coalesce(func.sum(cast(Message.has_media, Integer)), 0).label("media"),
+        )
+        .where(Message.session_id == session_id)
+        .group_by(Message.sender)
+    )
+    rows = result.all()
     
-    # Calculate stats
-    senders = {}
-    for msg in messages:
-        if msg.sender not in senders:
-            senders[msg.sender] = {"count": 0, "deleted": 0}
-        senders[msg.sender]["count"] += 1
-        if msg.is_deleted:
-            senders[msg.sender]["deleted"] += 1
+    senders = {r.sender: {"count": r.count, "deleted": r.deleted} for r in rows}
     
     return {
         "session_id": str(session_id),
-        "total_messages": len(messages),
-        "deleted_messages": sum(1 for m in messages if m.is_deleted),
-        "media_messages": sum(1 for m in messages if m.has_media),
+        "total_messages": sum(r.count for r in rows),
+        "deleted_messages": sum(r.deleted for r in rows),
+        "media_messages": sum(r.media for r in rows),
         "participants": senders,
         "date_range": {
             "start": session.start_timestamp.isoformat() if session.start_timestamp else None,
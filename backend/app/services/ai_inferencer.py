@@ -2,17 +2,77 @@
 AI Inferencer Service
 Uses Gemini 3.0 API (or mock) to predict deleted message content
 """
+import re
 import json
+import math
+import logging
+import time
 import random
-from typing import List, Optional, Dict
-from dataclasses import dataclass, asdict
+import asyncio
+import hashlib
+import inspect
+import sqlite3
+import threading
+from datetime import timedelta
+from typing import Any, AsyncIterator, List, Optional, Dict, Tuple
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, replace
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import chain
 
-from app.config import get_settings
+import orjson
+
+from app.config import settings
 from app.services.gap_detector import DetectedGap
 
 
-@dataclass
+logger = logging.getLogger(__name__)
+
+
+# API key the genai module is configured with; reconfiguring discards its
+# cached service clients (and their open channels), so it happens once per key
+_configured_api_key: Optional[str] = None
+_configure_lock = threading.Lock()
+
+# Results carrying these flags came from a failed call and are never cached
+UNCACHEABLE_FLAGS = frozenset({"GEMINI_API_FALLBACK", "PARSE_ERROR"})
+
+
+def _is_cacheable(result: "InferenceResult") -> bool:
+    """Whether a result is a genuine answer worth reusing"""
+    return UNCACHEABLE_FLAGS.isdisjoint(result.hallucination_flags)
+
+
+class BlockedResponseError(ValueError):
+    """Gemini returned no content (blocked by safety filters)"""
+
+
+@lru_cache(maxsize=8)
+def _shared_generative_model(
+    api_key: str,
+    model: str,
+    safety_settings: Tuple,
+    generation_config: Tuple,
+    system_instruction: Optional[str] = None,
+):
+    """
+    GenerativeModel shared by every inferencer with the same key and settings
+    
+    Settings arrive as tuples of items so they can key the cache; the model
+    binds genai's service client for the configured key on first use.
+    """
+    import google.generativeai as genai
+    return genai.GenerativeModel(
+        model_name=model,
+        safety_settings=[dict(setting) for setting in safety_settings],
+        generation_config=dict(generation_config),
+        system_instruction=system_instruction,
+    )
+
+
+@dataclass(slots=True)
 class InferenceResult:
     """Result of AI inference for a gap"""
     predicted_intent: str
@@ -23,6 +83,68 @@ class InferenceResult:
     reasoning: str
     model_used: str
     hallucination_flags: List[str]
+    
+    def to_dict(self) -> Dict:
+        """Shallow dict of the fields (asdict would deep-copy the lists)"""
+        return {
+            "predicted_intent": self.predicted_intent,
+            "predicted_content": self.predicted_content,
+            "predicted_sender": self.predicted_sender,
+            "confidence_score": self.confidence_score,
+            "context_anchors": self.context_anchors,
+            "reasoning": self.reasoning,
+            "model_used": self.model_used,
+            "hallucination_flags": self.hallucination_flags,
+        }
+
+
+@dataclass(slots=True)
+class _Transcript:
+    """A rendered transcript prefix and the digests derived from it"""
+    context: List[Dict]
+    prefix: str
+    attached: bool  # within the size range sent through CachedContent
+    prompt_digest: Any  # md5 over the attached prefix and "\n", copied per cache key
+    cache_key: str  # sha256 of the prefix, naming its CachedContent
+
+
+class TokenBucket:
+    """
+    Client-side request pacing shared by threads and the event loop
+    
+    Allows `rate` requests per second with bursts of up to `capacity`;
+    a rate of 0 disables pacing. Each acquire reserves a token under a lock
+    and then sleeps (or awaits) until that token is due.
+    """
+    
+    def __init__(self, rate: float, capacity: int = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _reserve(self) -> float:
+        """Take a token, returning how long to wait before it may be used"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate) - 1
+            self._updated = now
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+    
+    def acquire(self):
+        """Block until a request may be sent"""
+        wait = self._reserve()
+        if wait:
+            time.sleep(wait)
+    
+    async def acquire_async(self):
+        """Wait, without blocking the event loop, until a request may be sent"""
+        wait = self._reserve()
+        if wait:
+            await asyncio.sleep(wait)
 
 
 class BaseInferencer(ABC):
@@ -32,6 +154,53 @@ class BaseInferencer(ABC):
     def infer_gap(self, gap: DetectedGap, full_context: List[Dict]) -> InferenceResult:
         """Generate inference for a detected gap"""
         pass
+    
+    async def infer_gap_async(self, gap: DetectedGap, full_context: List[Dict] = None) -> InferenceResult:
+        """Generate inference without blocking the event loop"""
+        return await asyncio.to_thread(self.infer_gap, gap, full_context)
+    
+    @abstractmethod
+    def generate_anchors(self, gap: DetectedGap) -> List[Dict]:
+        """Context anchor references tying a result to the messages around its gap"""
+        pass
+    
+    async def infer_gap_stream(
+        self, gap: DetectedGap, full_context: List[Dict] = None
+    ) -> AsyncIterator[InferenceResult]:
+        """Yield partial results as they become available; the last one is final"""
+        yield await self.infer_gap_async(gap, full_context)
+    
+    def result_version(self) -> str:
+        """What produces the results (model, prompt); stored results are only reused for the same value"""
+        return type(self).__name__
+    
+    # Gaps sent per request by infer_gaps_batched (1 = one request per gap)
+    BATCH_SIZE = 1
+    
+    # Whether calls mostly wait on the network (worth running in threads)
+    IO_BOUND = True
+    
+    def infer_gaps_batched(self, gaps: List[DetectedGap], full_context: List[Dict] = None) -> List[InferenceResult]:
+        """Generate inferences for up to BATCH_SIZE gaps, in input order"""
+        return [self.infer_gap(gap, full_context) for gap in gaps]
+    
+    async def infer_gaps_batched_async(
+        self, gaps: List[DetectedGap], full_context: List[Dict] = None
+    ) -> List[InferenceResult]:
+        """Async variant of infer_gaps_batched"""
+        return [await self.infer_gap_async(gap, full_context) for gap in gaps]
+    
+    def preload_transcript(self, full_context: List[Dict]):
+        """Prepare state shared by every gap of one transcript"""
+        pass
+    
+    def release_transcript(self, full_context: List[Dict]):
+        """Drop state created by preload_transcript"""
+        pass
+    
+    async def aclose(self):
+        """Release network resources held by the inferencer"""
+        pass
 
 
 class MockInferencer(BaseInferencer):
@@ -42,45 +211,77 @@ class MockInferencer(BaseInferencer):
     
     MODEL_NAME = "mock-gemini-2.0"
     
-    # Templates for mock predictions based on context
-    INTENT_TEMPLATES = [
+    # Templates for mock predictions based on context, stored as bound
+    # str.format methods so picking one is a tuple index
+    INTENT_TEMPLATES = tuple(t.format for t in (
         "Discussion about {topic} likely continued",
         "Possible exchange of sensitive information related to {topic}",
         "Negotiation or agreement regarding {topic}",
         "Follow-up questions about {topic}",
         "Clarification request about previous statement",
         "Reaction to shared media or document",
-    ]
+    ))
     
-    CONTENT_TEMPLATES = [
+    CONTENT_TEMPLATES = tuple(t.format for t in (
         "[REDACTED: Possible discussion about {topic}]",
         "[INFERRED: Response confirming previous statement]",
         "[PREDICTED: Question seeking clarification]",
         "[MOCK: Agreement or acknowledgment message]",
-    ]
+    ))
+    
+    # Mock results are built locally, so batch freely
+    BATCH_SIZE = 256
+    IO_BOUND = False
+    
+    def __init__(self, seed: Optional[int] = None):
+        # Own generator, so a seeded inferencer produces reproducible results
+        self._rng = random.Random(seed)
     
     def infer_gap(self, gap: DetectedGap, full_context: List[Dict] = None) -> InferenceResult:
         """Generate mock inference based on gap context"""
-        
+        return self._build_mock_result(
+            gap,
+            self._calculate_mock_confidence(gap),
+            self._rng.choice(self.INTENT_TEMPLATES),
+            self._rng.choice(self.CONTENT_TEMPLATES),
+        )
+    
+    def infer_gaps_batched(self, gaps: List[DetectedGap], full_context: List[Dict] = None) -> List[InferenceResult]:
+        """Generate mock inferences for many gaps, scoring and drawing templates in one pass"""
+        count = len(gaps)
+        return [
+            self._build_mock_result(gap, confidence, intent_template, content_template)
+            for gap, confidence, intent_template, content_template in zip(
+                gaps,
+                self._score_batch(gaps),
+                self._rng.choices(self.INTENT_TEMPLATES, k=count),
+                self._rng.choices(self.CONTENT_TEMPLATES, k=count),
+            )
+        ]
+    
+    async def infer_gaps_batched_async(
+        self, gaps: List[DetectedGap], full_context: List[Dict] = None
+    ) -> List[InferenceResult]:
+        """Mock inference is CPU-only and fast, so it runs inline"""
+        return self.infer_gaps_batched(gaps, full_context)
+    
+    def _build_mock_result(
+        self, gap: DetectedGap, confidence: float, intent_template, content_template
+    ) -> InferenceResult:
+        """Assemble a mock prediction from a precomputed confidence and drawn templates"""
         # Extract topic hints from context
         topic = self._extract_topic(gap.context_before, gap.context_after)
         
         # Determine likely sender from pattern
         likely_sender = self._predict_sender(gap.context_before, gap.context_after)
         
-        # Generate confidence based on available context
-        confidence = self._calculate_mock_confidence(gap)
-        
         # Generate anchors from context
-        anchors = self._generate_anchors(gap)
+        anchors = self.generate_anchors(gap)
         
         # Build mock prediction
-        intent_template = random.choice(self.INTENT_TEMPLATES)
-        content_template = random.choice(self.CONTENT_TEMPLATES)
-        
         return InferenceResult(
-            predicted_intent=intent_template.format(topic=topic),
-            predicted_content=content_template.format(topic=topic),
+            predicted_intent=intent_template(topic=topic),
+            predicted_content=content_template(topic=topic),
             predicted_sender=likely_sender,
             confidence_score=confidence,
             context_anchors=anchors,
@@ -89,20 +290,22 @@ class MockInferencer(BaseInferencer):
             hallucination_flags=["MOCK_DATA", "NOT_REAL_PREDICTION"],
         )
     
+    async def infer_gap_async(self, gap: DetectedGap, full_context: List[Dict] = None) -> InferenceResult:
+        """Mock inference is CPU-only and fast, so no thread hop is needed"""
+        return self.infer_gap(gap, full_context)
+    
     def _extract_topic(self, before: List[Dict], after: List[Dict]) -> str:
         """Extract likely topic from surrounding messages"""
-        all_content = []
-        
-        for msg in before + after:
-            content = msg.get("content", "")
-            if content and len(content) > 3:
-                all_content.append(content)
-        
-        if not all_content:
+        # Only the first substantial message is used, so stop scanning there
+        content = next(
+            (c for c in (msg.get("content", "") for msg in chain(before, after)) if c and len(c) > 3),
+            None,
+        )
+        if content is None:
             return "unidentified matter"
         
         # Simple: use first few words of nearby message
-        sample = all_content[0][:50].strip()
+        sample = content[:50].strip()
         if len(sample) > 30:
             sample = sample[:30] + "..."
         
@@ -119,40 +322,38 @@ class MockInferencer(BaseInferencer):
         # If same sender before and after, deleted message was likely from other person
         if last_sender and next_sender and last_sender == next_sender:
             # Look for other participants
-            all_senders = set()
-            for msg in before + after:
-                all_senders.add(msg.get("sender"))
-            
-            others = all_senders - {last_sender}
+            others = {msg.get("sender") for msg in chain(before, after)} - {last_sender}
             if others:
-                return list(others)[0]
+                return next(iter(others))
         
         return last_sender
     
+    def _score_batch(self, gaps: List[DetectedGap]) -> List[float]:
+        """
+        Calculate mock confidence scores for many gaps in one pass
+        
+        A single comprehension over plain scalars, without per-gap method
+        calls or context list copies.
+        """
+        return [
+            min(
+                0.4
+                # More context = higher confidence
+                + min((len(g.context_before) + len(g.context_after)) * 0.05, 0.3)
+                # Shorter gaps = higher confidence
+                + (0.15 if g.time_gap_seconds < 3600 else 0.1 if g.time_gap_seconds < 7200 else 0.0)
+                # Explicit deletions = higher confidence something important was there
+                + (0.1 if g.detection_type == "explicit_deletion" else 0.05),
+                0.85,
+            )
+            for g in gaps
+        ]
+    
     def _calculate_mock_confidence(self, gap: DetectedGap) -> float:
         """Calculate mock confidence score"""
-        base = 0.4
-        
-        # More context = higher confidence
-        context_bonus = min(len(gap.context_before + gap.context_after) * 0.05, 0.3)
-        
-        # Shorter gaps = higher confidence
-        if gap.time_gap_seconds < 3600:
-            time_bonus = 0.15
-        elif gap.time_gap_seconds < 7200:
-            time_bonus = 0.1
-        else:
-            time_bonus = 0.0
-        
-        # Explicit deletions = higher confidence something important was there
-        if gap.detection_type == "explicit_deletion":
-            type_bonus = 0.1
-        else:
-            type_bonus = 0.05
-        
-        return min(base + context_bonus + time_bonus + type_bonus, 0.85)
+        return self._score_batch([gap])[0]
     
-    def _generate_anchors(self, gap: DetectedGap) -> List[Dict]:
+    def generate_anchors(self, gap: DetectedGap) -> List[Dict]:
         """Generate context anchor references"""
         anchors = []
         
@@ -196,15 +397,130 @@ class GeminiInferencer(BaseInferencer):
     """
     
     MAX_RETRIES = 3
-    BASE_DELAY = 1.0  # seconds
+    BASE_DELAY = 1.0  # seconds (rate limits)
+    SERVER_ERROR_DELAY = 0.5  # seconds (transient 5xx / timeouts)
     MAX_DELAY = 30.0  # seconds
     
-    def __init__(self, api_key: str, model: str = "gemini-2.0-flash"):
+    # Malformed JSON is re-asked at once with this reminder appended
+    PARSE_RETRIES = 2
+    JSON_ONLY_REMINDER = "\n\nPENTING: Balas HANYA dengan objek JSON yang valid, tanpa teks lain."
+    
+    # Gaps per batched request, and output token budget per gap
+    BATCH_SIZE = 8
+    OUTPUT_TOKENS_PER_GAP = 1024
+    MAX_OUTPUT_TOKENS = 8192
+    
+    # Explicit context caching of the transcript prefix (with the system prompt).
+    # Gemini rejects caches below a few thousand tokens, and long transcripts
+    # would blow the context window and token budget, so the transcript is
+    # only attached within this range (~4k-100k tokens at ~4 chars a token)
+    # and only through its CachedContent, never inline.
+    PREFIX_CACHE_MIN_CHARS = 16000
+    PREFIX_CACHE_MAX_CHARS = 400000
+    PREFIX_CACHE_TTL = timedelta(minutes=30)
+    PREFIX_CACHE_LIMIT = 16
+    PREFIX_CACHE_RETRY_SECONDS = 60  # a failed creation is retried after this
+    
+    # Exact-match cache of results by rendered prompt (LRU)
+    RESPONSE_CACHE_SIZE = 1024
+    
+    # Bump when the gap section layout or the parsed response fields change;
+    # edits to the prompt texts below are picked up by result_version itself
+    PROMPT_VERSION = 1
+    
+    # Gap context contents are clipped to this many characters in prompts
+    # (stored context keeps 200); fewer input tokens per gap request
+    PROMPT_CONTENT_CHARS = 120
+    
+    # Static instructions (role, rules, method, format), set once on the model
+    # as its system instruction instead of leading every prompt
+    SYSTEM_PROMPT = """## PERAN
+Anda adalah analis forensik digital yang SANGAT KONSERVATIF. Tugas Anda adalah menganalisis gap dalam riwayat chat untuk mendeteksi kemungkinan pesan yang dihapus.
+
+## ATURAN ANTI-HALUSINASI (WAJIB DIPATUHI)
+1. **JANGAN PERNAH mengarang isi pesan** - Jika tidak ada bukti kuat, gunakan null
+2. **Hanya prediksi yang DAPAT DIBUKTIKAN** dari konteks sekitar
+3. **Lebih baik bilang "tidak tahu" daripada menebak**
+4. **Setiap klaim HARUS memiliki bukti** dari pesan sebelum/sesudah gap
+5. **Confidence score MAKSIMUM 0.7** kecuali ada bukti sangat kuat
+
+## METODE ANALISIS (Chain-of-Thought)
+
+### Langkah 1: Analisis Pola Gilir Bicara
+- Siapa yang berbicara terakhir sebelum gap?
+- Siapa yang berbicara pertama setelah gap?
+- Apakah ada pelanggaran pola gilir yang menunjukkan pesan hilang?
+
+### Langkah 2: Cari Bukti Konkret
+- Apakah ada pertanyaan tanpa jawaban?
+- Apakah ada jawaban tanpa pertanyaan?
+- Apakah ada referensi ke hal yang tidak disebutkan?
+- Apakah ada kata seperti "iya", "oke", "setuju" tanpa konteks?
+
+### Langkah 3: Evaluasi Kepercayaan
+- 0.1-0.3: Hanya dugaan berdasarkan durasi gap
+- 0.4-0.5: Ada indikasi lemah dari perubahan topik
+- 0.6-0.7: Ada bukti jelas (pertanyaan tanpa jawaban, dll)
+- 0.8-1.0: HANYA jika ada pesan "dihapus" eksplisit
+
+### Langkah 4: Flag Semua Spekulasi
+- Tandai SETIAP aspek prediksi yang tidak bisa dibuktikan 100%
+
+## FORMAT RESPONS (JSON)
+{
+    "predicted_intent": "Deskripsi SINGKAT dan KONSERVATIF (atau null jika tidak cukup bukti)",
+    "predicted_content": null,
+    "predicted_sender": "Nama pengirim HANYA jika bisa ditentukan dari pola gilir bicara (atau null)",
+    "confidence_score": 0.5,
+    "reasoning": "Langkah-langkah analisis Anda dengan KUTIPAN SPESIFIK dari konteks sebagai bukti",
+    "hallucination_flags": ["WAJIB ISI - minimal 'INFERENCE_BASED' jika ada prediksi apapun"]
+}
+
+## CONTOH RESPONS KONSERVATIF
+Jika tidak ada bukti kuat:
+{
+    "predicted_intent": null,
+    "predicted_content": null,
+    "predicted_sender": null,
+    "confidence_score": 0.2,
+    "reasoning": "Gap terdeteksi tetapi tidak ada bukti linguistik yang cukup untuk memprediksi isi pesan. Perubahan topik bisa disebabkan oleh jeda waktu natural.",
+    "hallucination_flags": ["NO_EVIDENCE", "TIME_GAP_ONLY"]
+}
+"""
+    
+    # Replaces the single-gap response format when several gaps share a request
+    BATCH_INSTRUCTIONS = """## FORMAT RESPONS BATCH (JSON)
+Analisis SETIAP gap di bawah secara TERPISAH dengan aturan dan format dari instruksi sistem.
+Kembalikan satu objek dengan tepat satu entri per gap, "id" sesuai judul gap:
+{
+    "results": [
+        {"id": "GAP_1", "predicted_intent": "...", "predicted_content": null, "predicted_sender": null, "confidence_score": 0.5, "reasoning": "...", "hallucination_flags": ["..."]}
+    ]
+}
+"""
+    
+    def __init__(self, api_key: str, model: str = "gemini-2.0-flash", requests_per_minute: int = 0):
         self.api_key = api_key
         self.model = model
         self._client = None
         self._genai = None
         
+        # Paces requests below the API quota so 429s stay exceptional
+        self._rate_limiter = TokenBucket(requests_per_minute / 60)
+        
+        # Prefix hash -> (model bound to its CachedContent or None, expiry);
+        # one creation lock per prefix so concurrent misses create it once
+        self._prefix_models: Dict[str, Tuple[Any, float]] = {}
+        self._prefix_locks: Dict[str, threading.Lock] = {}
+        self._prefix_models_lock = threading.Lock()
+        
+        # id(full_context) -> rendered and hashed prefix for open transcripts
+        self._transcript_prefixes: Dict[int, _Transcript] = {}
+        
+        # md5 of rendered prompt -> InferenceResult, most recently used last
+        self._response_cache: OrderedDict = OrderedDict()
+        self._response_cache_lock = threading.Lock()
+        
         # Lazy initialization
         self._initialize_client()
     
@@ -213,7 +529,12 @@ class GeminiInferencer(BaseInferencer):
         import google.generativeai as genai
         self._genai = genai
         
-        genai.configure(api_key=self.api_key)
+        # Keep genai's pooled connections across inferencer instances
+        global _configured_api_key
+        with _configure_lock:
+            if _configured_api_key != self.api_key:
+                genai.configure(api_key=self.api_key)
+                _configured_api_key = self.api_key
         
         # Configure safety settings for forensic analysis
         safety_settings = [
@@ -232,10 +553,14 @@ class GeminiInferencer(BaseInferencer):
             "response_mime_type": "application/json",
         }
         
-        self._client = genai.GenerativeModel(
-            model_name=self.model,
-            safety_settings=safety_settings,
-            generation_config=generation_config,
+        self._safety_settings = safety_settings
+        self._generation_config = generation_config
+        self._client = _shared_generative_model(
+            self.api_key,
+            self.model,
+            tuple(tuple(setting.items()) for setting in safety_settings),
+            tuple(generation_config.items()),
+            self.SYSTEM_PROMPT,
         )
     
     def infer_gap(self, gap: DetectedGap, full_context: List[Dict] = None) -> InferenceResult:
@@ -243,58 +568,481 @@ class GeminiInferencer(BaseInferencer):
         Generate inference using Gemini API with retry logic
         Implements context anchoring for hallucination prevention
         """
-        import time
+        suffix = self._build_gap_suffix(gap)
+        transcript = self._transcript(full_context)
+        key = self._response_cache_key(suffix, transcript)
+        cached = self._cached_response(key, gap)
+        if cached:
+            return cached
         
-        prompt = self._build_prompt(gap, full_context)
+        client, prompt = self._prepare_request(suffix, transcript)
         last_error = None
+        attempt = reasks = 0
         
-        for attempt in range(self.MAX_RETRIES):
+        while attempt < self.MAX_RETRIES:
             try:
-                response = self._client.generate_content(prompt)
-                
-                # Check if response was blocked
-                if not response.parts:
-                    raise ValueError("Response blocked by safety filters")
-                
-                parsed = self._parse_response(response.text)
-                
-                # Handle null values from conservative AI responses
-                predicted_intent = parsed.get("predicted_intent")
-                if not predicted_intent or predicted_intent == "null":
-                    predicted_intent = "Tidak cukup bukti untuk prediksi"
-                
-                return InferenceResult(
-                    predicted_intent=predicted_intent,
-                    predicted_content=parsed.get("predicted_content"),
-                    predicted_sender=parsed.get("predicted_sender"),
-                    confidence_score=self._validate_confidence(parsed.get("confidence_score", 0.5)),
-                    context_anchors=self._generate_anchors(gap),
-                    reasoning=parsed.get("reasoning", "AI analysis complete"),
-                    model_used=self.model,
-                    hallucination_flags=parsed.get("hallucination_flags", []),
-                )
+                self._rate_limiter.acquire()
+                response = client.generate_content(prompt + self.JSON_ONLY_REMINDER if reasks else prompt)
+                result = self._build_result(gap, response)
+                if "PARSE_ERROR" in result.hallucination_flags and reasks < self.PARSE_RETRIES:
+                    # Malformed JSON - re-ask right away, insisting on JSON only
+                    reasks += 1
+                    continue
+                return self._remember_response(key, result)
                 
             except Exception as e:
                 last_error = e
-                error_str = str(e).lower()
+                delay = self._retry_delay(e, attempt)
+                attempt += 1
+                if delay is None or attempt == self.MAX_RETRIES:
+                    # Non-retryable error (or out of attempts) - fail immediately
+                    break
+                time.sleep(delay)
+        
+        # All retries failed - fallback to mock
+        return self._fallback_to_mock(gap, full_context, last_error)
+    
+    async def infer_gap_async(self, gap: DetectedGap, full_context: List[Dict] = None) -> InferenceResult:
+        """Async variant of infer_gap using the SDK's non-blocking client"""
+        suffix = self._build_gap_suffix(gap)
+        transcript = self._transcript(full_context)
+        key = self._response_cache_key(suffix, transcript)
+        cached = self._cached_response(key, gap)
+        if cached:
+            return cached
+        
+        client, prompt = await self._prepare_request_async(suffix, transcript)
+        last_error = None
+        attempt = reasks = 0
+        
+        while attempt < self.MAX_RETRIES:
+            try:
+                await self._rate_limiter.acquire_async()
+                response = await client.generate_content_async(prompt + self.JSON_ONLY_REMINDER if reasks else prompt)
+                result = self._build_result(gap, response)
+                if "PARSE_ERROR" in result.hallucination_flags and reasks < self.PARSE_RETRIES:
+                    reasks += 1
+                    continue
+                return self._remember_response(key, result)
                 
-                # Check for retryable errors
-                if "429" in error_str or "quota" in error_str or "rate" in error_str:
-                    # Rate limited - wait with exponential backoff
-                    delay = min(self.BASE_DELAY * (2 ** attempt), self.MAX_DELAY)
+            except Exception as e:
+                last_error = e
+                delay = self._retry_delay(e, attempt)
+                attempt += 1
+                if delay is None or attempt == self.MAX_RETRIES:
+                    break
+                await asyncio.sleep(delay)
+        
+        return self._fallback_to_mock(gap, full_context, last_error)
+    
+    async def infer_gap_stream(
+        self, gap: DetectedGap, full_context: List[Dict] = None
+    ) -> AsyncIterator[InferenceResult]:
+        """
+        Stream the Gemini answer, yielding a result each time a field completes
+        
+        Intermediate results are flagged PARTIAL_RESULT; the last one yielded
+        is final. If the stream fails, the retrying infer_gap_async path
+        supplies the final result.
+        """
+        suffix = self._build_gap_suffix(gap)
+        transcript = self._transcript(full_context)
+        key = self._response_cache_key(suffix, transcript)
+        cached = self._cached_response(key, gap)
+        if cached:
+            yield cached
+            return
+        
+        client, prompt = await self._prepare_request_async(suffix, transcript)
+        text = ""
+        completed = 0
+        try:
+            await self._rate_limiter.acquire_async()
+            response = await client.generate_content_async(prompt, stream=True)
+            async for chunk in response:
+                text += chunk.text
+                fields = self._completed_fields(text)
+                if len(fields) > completed:
+                    completed = len(fields)
+                    partial = self._result_from_parsed(gap, fields)
+                    partial.hallucination_flags = list(partial.hallucination_flags) + ["PARTIAL_RESULT"]
+                    yield partial
+            result = self._result_from_parsed(gap, self._parse_response(text))
+        except Exception:
+            result = None
+        if result is None or "PARSE_ERROR" in result.hallucination_flags:
+            # Broken stream or malformed JSON: the retrying path takes over
+            result = await self.infer_gap_async(gap, full_context)
+        else:
+            self._remember_response(key, result)
+        yield result
+    
+    def infer_gaps_batched(self, gaps: List[DetectedGap], full_context: List[Dict] = None) -> List[InferenceResult]:
+        """
+        Generate inferences for several gaps with a single Gemini request
+        
+        Gaps missing from a partial reply are retried as a smaller batch.
+        If the reply cannot be parsed, is blocked or the request is too
+        large, the batch is split in half and each half retried, down to
+        single-gap requests. Rate-limit and server errors that outlast the
+        retries (and other failures) make the whole batch fall back instead,
+        since more requests would only add load.
+        """
+        if len(gaps) < 2:
+            return [self.infer_gap(gap, full_context) for gap in gaps]
+        
+        # Only gaps without a cached result go into the batch
+        transcript = self._transcript(full_context)
+        keys = [self._response_cache_key(self._build_gap_suffix(gap), transcript) for gap in gaps]
+        results = [self._cached_response(key, gap) for key, gap in zip(keys, gaps)]
+        pending = [i for i, result in enumerate(results) if not result]
+        if len(pending) < len(gaps):
+            fresh = self.infer_gaps_batched([gaps[i] for i in pending], full_context)
+            for i, result in zip(pending, fresh):
+                results[i] = result
+            return results
+        
+        client, prompt = self._prepare_request(self._build_batch_suffix(gaps), transcript)
+        
+        for attempt in range(self.MAX_RETRIES):
+            try:
+                self._rate_limiter.acquire()
+                response = client.generate_content(
+                    prompt, generation_config=self._batch_generation_config(gaps)
+                )
+                results = [
+                    self._remember_response(key, result) if result else None
+                    for key, result in zip(keys, self._build_batch_results(gaps, response))
+                ]
+                break
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is not None and attempt < self.MAX_RETRIES - 1:
                     time.sleep(delay)
                     continue
-                elif "500" in error_str or "503" in error_str or "timeout" in error_str:
-                    # Server error - retry with backoff
-                    delay = min(self.BASE_DELAY * (2 ** attempt), self.MAX_DELAY)
-                    time.sleep(delay)
+                if not self._splits_batch(e):
+                    return [self._fallback_to_mock(gap, full_context, e) for gap in gaps]
+                break
+        
+        for group in self._retry_groups(results):
+            for i, result in zip(group, self.infer_gaps_batched([gaps[i] for i in group], full_context)):
+                results[i] = result
+        return results
+    
+    async def infer_gaps_batched_async(
+        self, gaps: List[DetectedGap], full_context: List[Dict] = None
+    ) -> List[InferenceResult]:
+        """Async variant of infer_gaps_batched"""
+        if len(gaps) < 2:
+            return [await self.infer_gap_async(gap, full_context) for gap in gaps]
+        
+        # Only gaps without a cached result go into the batch
+        transcript = self._transcript(full_context)
+        keys = [self._response_cache_key(self._build_gap_suffix(gap), transcript) for gap in gaps]
+        results = [self._cached_response(key, gap) for key, gap in zip(keys, gaps)]
+        pending = [i for i, result in enumerate(results) if not result]
+        if len(pending) < len(gaps):
+            fresh = await self.infer_gaps_batched_async([gaps[i] for i in pending], full_context)
+            for i, result in zip(pending, fresh):
+                results[i] = result
+            return results
+        
+        client, prompt = await self._prepare_request_async(self._build_batch_suffix(gaps), transcript)
+        
+        for attempt in range(self.MAX_RETRIES):
+            try:
+                await self._rate_limiter.acquire_async()
+                response = await client.generate_content_async(
+                    prompt, generation_config=self._batch_generation_config(gaps)
+                )
+                results = [
+                    self._remember_response(key, result) if result else None
+                    for key, result in zip(keys, self._build_batch_results(gaps, response))
+                ]
+                break
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is not None and attempt < self.MAX_RETRIES - 1:
+                    await asyncio.sleep(delay)
                     continue
-                else:
-                    # Non-retryable error - fail immediately
-                    break
+                if not self._splits_batch(e):
+                    return [self._fallback_to_mock(gap, full_context, e) for gap in gaps]
+                break
         
-        # All retries failed - fallback to mock
-        return self._fallback_to_mock(gap, full_context, last_error)
+        # Halves go one after the other, so a split never adds concurrency
+        for group in self._retry_groups(results):
+            group_results = await self.infer_gaps_batched_async([gaps[i] for i in group], full_context)
+            for i, result in zip(group, group_results):
+                results[i] = result
+        return results
+    
+    # Request errors a smaller batch may avoid (InvalidArgument, e.g. too
+    # many tokens, and payload too large), besides blocked replies
+    SPLIT_ERROR_CODES = frozenset({400, 413})
+    
+    def _splits_batch(self, error: Exception) -> bool:
+        """Whether a failed batch request is worth retrying as two halves"""
+        return isinstance(error, BlockedResponseError) or getattr(error, "code", None) in self.SPLIT_ERROR_CODES
+    
+    @staticmethod
+    def _retry_groups(results: List[Optional[InferenceResult]]) -> List[List[int]]:
+        """
+        Index groups to re-batch after a batch request
+        
+        Missing gaps of a partial reply form one smaller batch; a batch with
+        no results at all is bisected, so every retry is strictly smaller.
+        """
+        missing = [i for i, result in enumerate(results) if not result]
+        if not missing or len(missing) < len(results):
+            return [missing] if missing else []
+        half = len(missing) // 2
+        return [missing[:half], missing[half:]]
+    
+    def preload_transcript(self, full_context: List[Dict]):
+        """Render and hash the transcript prefix once and create its CachedContent up front"""
+        if not full_context:
+            return
+        self._transcript_prefixes.pop(id(full_context), None)
+        transcript = self._transcript(full_context)
+        self._transcript_prefixes[id(full_context)] = transcript
+        if transcript.attached:
+            self._cached_prefix_model(transcript)
+    
+    def release_transcript(self, full_context: List[Dict]):
+        """Forget the rendered prefix (the CachedContent expires by its TTL)"""
+        self._transcript_prefixes.pop(id(full_context), None)
+    
+    def result_version(self) -> str:
+        """Model, prompt version and a digest of the instruction texts"""
+        digest = hashlib.md5((self.SYSTEM_PROMPT + self.BATCH_INSTRUCTIONS).encode()).hexdigest()
+        return f"{self.model}:{self.PROMPT_VERSION}:{digest[:12]}"
+    
+    async def aclose(self):
+        """Close genai's shared service clients and their pooled channels"""
+        from google.generativeai import client as genai_client
+        
+        # genai exposes no public close, so its private client registry is
+        # used when present; if a release has moved it, the channels are
+        # left to the process exit and shutdown carries on
+        manager = getattr(genai_client, "_client_manager", None)
+        clients = getattr(manager, "clients", None)
+        if not isinstance(clients, dict):
+            logger.warning("genai client registry not found; service clients left open")
+            clients = {}
+        for name, client in list(clients.items()):
+            try:
+                closing = client.transport.close()
+                if inspect.isawaitable(closing):
+                    await closing
+            except Exception:
+                logger.warning("Failed to close genai %s client", name, exc_info=True)
+        # Clients are recreated lazily from the stored configuration; shared
+        # models still hold the closed ones, so they are dropped too
+        clients.clear()
+        _shared_generative_model.cache_clear()
+    
+    def _prepare_request(self, suffix: str, transcript: Optional[_Transcript]) -> Tuple[Any, str]:
+        """
+        Choose the model and prompt text for a request
+        
+        Only the gap section (with its own context window) is sent. When the
+        transcript fits the cacheable range and its CachedContent exists,
+        the model is bound to it, so the transcript is seen at cache prices;
+        otherwise the request goes out without it.
+        """
+        if transcript is not None and transcript.attached:
+            model = self._cached_prefix_model(transcript)
+            if model is not None:
+                return model, suffix
+        return self._client, suffix
+    
+    async def _prepare_request_async(self, suffix: str, transcript: Optional[_Transcript]) -> Tuple[Any, str]:
+        """_prepare_request with cache creation (a blocking call) off the event loop"""
+        if transcript is None or not transcript.attached:
+            return self._client, suffix
+        return await asyncio.to_thread(self._prepare_request, suffix, transcript)
+    
+    def _transcript(self, full_context: Optional[List[Dict]]) -> Optional[_Transcript]:
+        """The preloaded transcript for this context, else one rendered and hashed now"""
+        if not full_context:
+            return None
+        preloaded = self._transcript_prefixes.get(id(full_context))
+        if preloaded and preloaded.context is full_context:
+            return preloaded
+        
+        prefix = self._build_cached_prefix(full_context)
+        attached = self.PREFIX_CACHE_MIN_CHARS <= len(prefix) <= self.PREFIX_CACHE_MAX_CHARS
+        # A transcript outside the cacheable range is never sent, so it is
+        # not part of the response cache key either
+        data = prefix.encode() if attached else b""
+        prompt_digest = hashlib.md5(data)
+        prompt_digest.update(b"\n")
+        return _Transcript(
+            context=full_context,
+            prefix=prefix,
+            attached=attached,
+            prompt_digest=prompt_digest,
+            cache_key=hashlib.sha256(data).hexdigest() if attached else "",
+        )
+    
+    def _cached_prefix_model(self, transcript: _Transcript):
+        """Model bound to a CachedContent for this transcript, or None if caching failed"""
+        key = transcript.cache_key
+        entry = self._prefix_models.get(key)
+        if entry and entry[1] > time.monotonic():
+            return entry[0]
+        
+        with self._prefix_models_lock:
+            lock = self._prefix_locks.setdefault(key, threading.Lock())
+        with lock:
+            # Another request may have created it while this one waited
+            entry = self._prefix_models.get(key)
+            if entry and entry[1] > time.monotonic():
+                return entry[0]
+            
+            model = self._create_prefix_model(transcript)
+            # Refresh a minute early so requests never hit an expired cache;
+            # a failure is only remembered briefly
+            if model is None:
+                lifetime = self.PREFIX_CACHE_RETRY_SECONDS
+            else:
+                lifetime = self.PREFIX_CACHE_TTL.total_seconds() - 60
+            with self._prefix_models_lock:
+                if key not in self._prefix_models and len(self._prefix_models) >= self.PREFIX_CACHE_LIMIT:
+                    self._prefix_models.pop(next(iter(self._prefix_models)))
+                self._prefix_models[key] = (model, time.monotonic() + lifetime)
+                self._prefix_locks.pop(key, None)
+        return model
+    
+    def _create_prefix_model(self, transcript: _Transcript):
+        """Create the CachedContent for a transcript and bind a model to it (None on failure)"""
+        try:
+            cached = self._genai.caching.CachedContent.create(
+                model=self.model,
+                display_name=f"shadowtrace-{transcript.cache_key[:16]}",
+                system_instruction=self.SYSTEM_PROMPT,
+                contents=[transcript.prefix],
+                ttl=self.PREFIX_CACHE_TTL,
+            )
+            return self._genai.GenerativeModel.from_cached_content(
+                cached,
+                generation_config=self._generation_config,
+                safety_settings=self._safety_settings,
+            )
+        except Exception:
+            # Unsupported model or quota: requests go out without the transcript
+            return None
+    
+    def _response_cache_key(self, suffix: str, transcript: Optional[_Transcript]) -> str:
+        """
+        Cache key: md5 of the single-gap prompt as the model sees it
+        
+        Takes the already rendered gap suffix, which is reused for the
+        request itself, and continues the transcript's digest (hashed once
+        per transcript) instead of rehashing the prefix per gap.
+        """
+        digest = transcript.prompt_digest.copy() if transcript else hashlib.md5(b"\n")
+        digest.update(suffix.encode())
+        return digest.hexdigest()
+    
+    def _cached_response(self, key: str, gap: DetectedGap) -> Optional[InferenceResult]:
+        """Copy of the cached result for a prompt, anchored to this gap"""
+        with self._response_cache_lock:
+            result = self._response_cache.get(key)
+            if result is None:
+                return None
+            self._response_cache.move_to_end(key)
+        # Identical prompts can come from different gaps (the prompt has no
+        # sequence numbers), so anchors are rebuilt rather than reused
+        return replace(
+            result,
+            context_anchors=self.generate_anchors(gap),
+            hallucination_flags=list(result.hallucination_flags),
+        )
+    
+    def _remember_response(self, key: str, result: InferenceResult) -> InferenceResult:
+        """Cache a successful API result (fallbacks and parse errors are never cached)"""
+        if _is_cacheable(result):
+            with self._response_cache_lock:
+                self._response_cache[key] = result
+                self._response_cache.move_to_end(key)
+                if len(self._response_cache) > self.RESPONSE_CACHE_SIZE:
+                    self._response_cache.popitem(last=False)
+        return result
+    
+    def _batch_generation_config(self, gaps: List[DetectedGap]) -> Dict:
+        """Per-request override giving each gap in a batch its own output budget"""
+        return {
+            "max_output_tokens": min(self.OUTPUT_TOKENS_PER_GAP * len(gaps), self.MAX_OUTPUT_TOKENS),
+        }
+    
+    def _build_result(self, gap: DetectedGap, response) -> InferenceResult:
+        """Convert a Gemini response into an InferenceResult"""
+        # Check if response was blocked
+        if not response.parts:
+            raise BlockedResponseError("Response blocked by safety filters")
+        
+        return self._result_from_parsed(gap, self._parse_response(response.text))
+    
+    def _build_batch_results(self, gaps: List[DetectedGap], response) -> List[Optional[InferenceResult]]:
+        """Demultiplex a batched Gemini response by gap id (None where missing)"""
+        if not response.parts:
+            raise BlockedResponseError("Response blocked by safety filters")
+        
+        by_id = self._parse_batch_response(response.text)
+        return [
+            self._result_from_parsed(gap, by_id[f"GAP_{i}"]) if f"GAP_{i}" in by_id else None
+            for i, gap in enumerate(gaps, 1)
+        ]
+    
+    def _result_from_parsed(self, gap: DetectedGap, parsed: Dict) -> InferenceResult:
+        """Build an InferenceResult from one parsed JSON answer"""
+        # Handle null values from conservative AI responses
+        predicted_intent = parsed.get("predicted_intent")
+        if not predicted_intent or predicted_intent == "null":
+            predicted_intent = "Tidak cukup bukti untuk prediksi"
+        
+        return InferenceResult(
+            predicted_intent=predicted_intent,
+            predicted_content=parsed.get("predicted_content"),
+            predicted_sender=parsed.get("predicted_sender"),
+            confidence_score=self._validate_confidence(parsed.get("confidence_score", 0.5)),
+            context_anchors=self.generate_anchors(gap),
+            reasoning=parsed.get("reasoning", "AI analysis complete"),
+            model_used=self.model,
+            hallucination_flags=parsed.get("hallucination_flags", []),
+        )
+    
+    # Status codes worth retrying (google.api_core exceptions carry it as .code)
+    RATE_LIMIT_CODES = frozenset({429})
+    SERVER_ERROR_CODES = frozenset({500, 502, 503, 504})
+    
+    # Message patterns, only consulted for errors without a status code
+    _RATE_LIMIT_RE = re.compile(r"\b429\b|\bquota\b|\brate[ _-]?limit", re.IGNORECASE)
+    _SERVER_ERROR_RE = re.compile(
+        r"\b50[0234]\b|\btime(?:d ?)?out\b|\bdeadline exceeded\b|\bunavailable\b", re.IGNORECASE
+    )
+    
+    def _retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """Backoff delay for a retryable error, or None if it should not be retried"""
+        # Rate limits back off from BASE_DELAY, transient server errors from
+        # the shorter SERVER_ERROR_DELAY; anything else is not retried
+        code = getattr(error, "code", None)
+        if isinstance(code, int) and not isinstance(code, bool):
+            if code in self.RATE_LIMIT_CODES:
+                base = self.BASE_DELAY
+            elif code in self.SERVER_ERROR_CODES:
+                base = self.SERVER_ERROR_DELAY
+            else:
+                return None
+        elif self._RATE_LIMIT_RE.search(str(error)):
+            base = self.BASE_DELAY
+        elif isinstance(error, TimeoutError) or self._SERVER_ERROR_RE.search(str(error)):
+            base = self.SERVER_ERROR_DELAY
+        else:
+            return None
+        # Jitter keeps concurrent requests from retrying in lockstep
+        return min(base * (2 ** attempt), self.MAX_DELAY) * (0.5 + random.random())
     
     def _fallback_to_mock(self, gap: DetectedGap, full_context: List[Dict], error: Exception) -> InferenceResult:
         """Fallback to mock inferencer on API failure"""
@@ -316,29 +1064,37 @@ class GeminiInferencer(BaseInferencer):
         except (TypeError, ValueError):
             return 0.5
     
+    def _extract_json(self, response_text: str) -> str:
+        """Strip markdown fences and surrounding prose from a JSON reply"""
+        # JSON mode replies are usually bare objects; orjson skips whitespace itself
+        if response_text.lstrip().startswith("{"):
+            return response_text
+        
+        text = response_text.strip()
+        
+        # Remove markdown code blocks if present
+        if text.startswith("```json"):
+            text = text[7:]
+        elif text.startswith("```"):
+            text = text[3:]
+        if text.endswith("```"):
+            text = text[:-3]
+        
+        # Try to find JSON object in response
+        text = text.strip()
+        if not text.startswith("{"):
+            # Try to find JSON in the response
+            start = text.find("{")
+            end = text.rfind("}") + 1
+            if start != -1 and end > start:
+                text = text[start:end]
+        
+        return text
+    
     def _parse_response(self, response_text: str) -> Dict:
         """Parse Gemini response JSON with robust handling"""
         try:
-            text = response_text.strip()
-            
-            # Remove markdown code blocks if present
-            if text.startswith("```json"):
-                text = text[7:]
-            elif text.startswith("```"):
-                text = text[3:]
-            if text.endswith("```"):
-                text = text[:-3]
-            
-            # Try to find JSON object in response
-            text = text.strip()
-            if not text.startswith("{"):
-                # Try to find JSON in the response
-                start = text.find("{")
-                end = text.rfind("}") + 1
-                if start != -1 and end > start:
-                    text = text[start:end]
-            
-            parsed = json.loads(text)
+            parsed = orjson.loads(self._extract_json(response_text))
             
             # Validate required fields
             if "predicted_intent" not in parsed:
@@ -346,7 +1102,7 @@ class GeminiInferencer(BaseInferencer):
             
             return parsed
             
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             return {
                 "predicted_intent": f"JSON parse error: {str(e)[:30]}",
                 "predicted_content": None,
@@ -355,7 +1111,67 @@ class GeminiInferencer(BaseInferencer):
                 "hallucination_flags": ["PARSE_ERROR", "RAW_RESPONSE"],
             }
     
-    def _generate_anchors(self, gap: DetectedGap) -> List[Dict]:
+    ANSWER_FIELDS = frozenset({
+        "predicted_intent", "predicted_content", "predicted_sender",
+        "confidence_score", "reasoning", "hallucination_flags",
+    })
+    # orjson has no incremental decode, so streamed fields use the stdlib decoder
+    _DECODER = json.JSONDecoder()
+    _SPACE_RE = re.compile(r"\s*")
+    
+    def _completed_fields(self, partial_text: str) -> Dict:
+        """
+        Top-level answer fields whose values are already complete in a partial reply
+        
+        Walks the members of the outer object one by one, so key names that
+        appear inside string values (e.g. quoted in the reasoning) or in
+        nested objects are never mistaken for fields.
+        """
+        fields = {}
+        start = partial_text.find("{")
+        if start < 0:
+            return fields
+        skip, decode = self._SPACE_RE.match, self._DECODER.raw_decode
+        pos = skip(partial_text, start + 1).end()
+        while partial_text.startswith('"', pos):
+            try:
+                key, pos = decode(partial_text, pos)
+                pos = skip(partial_text, pos).end()
+                if not partial_text.startswith(":", pos):
+                    break
+                value, pos = decode(partial_text, skip(partial_text, pos + 1).end())
+            except json.JSONDecodeError:
+                break  # Key or value still streaming
+            # A number is only complete once something follows it
+            if pos == len(partial_text):
+                break
+            if key in self.ANSWER_FIELDS:
+                fields[key] = value
+            pos = skip(partial_text, pos).end()
+            if not partial_text.startswith(",", pos):
+                break
+            pos = skip(partial_text, pos + 1).end()
+        return fields
+    
+    def _parse_batch_response(self, response_text: str) -> Dict[str, Dict]:
+        """Parse a batched reply into {gap id: answer}; empty if unusable"""
+        try:
+            parsed = orjson.loads(self._extract_json(response_text))
+        except orjson.JSONDecodeError:
+            return {}
+        
+        items = parsed.get("results") if isinstance(parsed, dict) else None
+        if not isinstance(items, list):
+            return {}
+        
+        by_id = {}
+        for item in items:
+            if isinstance(item, dict) and item.get("id"):
+                item.setdefault("predicted_intent", "Intent could not be determined")
+                by_id[str(item["id"])] = item
+        return by_id
+    
+    def generate_anchors(self, gap: DetectedGap) -> List[Dict]:
         """Generate context anchor references for verification"""
         anchors = []
         
@@ -377,16 +1193,52 @@ class GeminiInferencer(BaseInferencer):
         
         return anchors
     
-    def _build_prompt(self, gap: DetectedGap, full_context: List[Dict]) -> str:
-        """Build forensic analysis prompt with context anchoring instructions"""
-        context_before = "\n".join(
-            f"[{m.get('timestamp')}] {m.get('sender')}: {m.get('content')}"
-            for m in gap.context_before
+    def _build_cached_prefix(self, full_context: List[Dict]) -> str:
+        """
+        Transcript section stored as CachedContent contents
+        
+        It is never gap-specific and never sent inline; _prepare_request
+        binds it to a request only through an existing CachedContent.
+        """
+        return f"""## TRANSKRIP LENGKAP
+{self._format_messages(full_context)}
+"""
+    
+    def _build_gap_suffix(self, gap: DetectedGap) -> str:
+        """Gap-specific part of a single-gap prompt"""
+        return f"""## KONTEKS PERCAKAPAN
+
+{self._format_gap_section(gap)}"""
+    
+    def _build_batch_suffix(self, gaps: List[DetectedGap]) -> str:
+        """Gap-specific part of a batched prompt"""
+        sections = "\n".join(
+            f"## GAP_{i}\n\n{self._format_gap_section(gap)}"
+            for i, gap in enumerate(gaps, 1)
         )
-        context_after = "\n".join(
-            f"[{m.get('timestamp')}] {m.get('sender')}: {m.get('content')}"
-            for m in gap.context_after
+        return f"""{self.BATCH_INSTRUCTIONS}
+## KONTEKS PERCAKAPAN
+
+{sections}"""
+    
+    def _format_messages(self, messages: List[Dict], max_chars: Optional[int] = None) -> str:
+        """Format context messages one per line, clipping contents to max_chars if given"""
+        return "\n".join(
+            f"[{m.get('timestamp')}] {m.get('sender')}: {self._clip(m.get('content'), max_chars)}"
+            for m in messages
         )
+    
+    @staticmethod
+    def _clip(content: Optional[str], max_chars: Optional[int]) -> Optional[str]:
+        """Shorten content to max_chars, marking the cut with an ellipsis"""
+        if max_chars is None or content is None or len(content) <= max_chars:
+            return content
+        return content[:max_chars] + "..."
+    
+    def _format_gap_section(self, gap: DetectedGap) -> str:
+        """Format the messages around a gap and its detection details"""
+        context_before = self._format_messages(gap.context_before, self.PROMPT_CONTENT_CHARS)
+        context_after = self._format_messages(gap.context_after, self.PROMPT_CONTENT_CHARS)
         
         # Format time gap for readability
         hours, remainder = divmod(int(gap.time_gap_seconds), 3600)
@@ -399,19 +1251,7 @@ class GeminiInferencer(BaseInferencer):
             if m.get("sender"):
                 participants.add(m.get("sender"))
         
-        return f"""## PERAN
-Anda adalah analis forensik digital yang SANGAT KONSERVATIF. Tugas Anda adalah menganalisis gap dalam riwayat chat untuk mendeteksi kemungkinan pesan yang dihapus.
-
-## ATURAN ANTI-HALUSINASI (WAJIB DIPATUHI)
-1. **JANGAN PERNAH mengarang isi pesan** - Jika tidak ada bukti kuat, gunakan null
-2. **Hanya prediksi yang DAPAT DIBUKTIKAN** dari konteks sekitar
-3. **Lebih baik bilang "tidak tahu" daripada menebak**
-4. **Setiap klaim HARUS memiliki bukti** dari pesan sebelum/sesudah gap
-5. **Confidence score MAKSIMUM 0.7** kecuali ada bukti sangat kuat
-
-## KONTEKS PERCAKAPAN
-
-### Pesan Sebelum Gap:
+        return f"""### Pesan Sebelum Gap:
 {context_before}
 
 ### [GAP TERDETEKSI]
@@ -423,50 +1263,396 @@ Anda adalah analis forensik digital yang SANGAT KONSERVATIF. Tugas Anda adalah m
 
 ### Pesan Setelah Gap:
 {context_after}
+"""
 
-## METODE ANALISIS (Chain-of-Thought)
-
-### Langkah 1: Analisis Pola Gilir Bicara
-- Siapa yang berbicara terakhir sebelum gap?
-- Siapa yang berbicara pertama setelah gap?
-- Apakah ada pelanggaran pola gilir yang menunjukkan pesan hilang?
 
-### Langkah 2: Cari Bukti Konkret
-- Apakah ada pertanyaan tanpa jawaban?
-- Apakah ada jawaban tanpa pertanyaan?
-- Apakah ada referensi ke hal yang tidak disebutkan?
-- Apakah ada kata seperti "iya", "oke", "setuju" tanpa konteks?
+class SemanticInferenceCache(BaseInferencer):
+    """
+    Reuses inferences for gaps whose surrounding text is nearly identical
+    
+    Gaps are compared by cosine similarity of bag-of-words vectors built
+    from their context and suspicion reasons (no embedding model needed).
+    Hits return a copy of the cached result flagged SEMANTIC_CACHE_HIT,
+    anchored to the requesting gap.
+    """
+    
+    MAX_ENTRIES = 512
+    HIT_FLAG = "SEMANTIC_CACHE_HIT"
+    
+    _WORD_RE = re.compile(r"\w+")
+    
+    def __init__(self, inner: BaseInferencer, threshold: float = 0.88):
+        self.inner = inner
+        self.threshold = threshold
+        self.BATCH_SIZE = inner.BATCH_SIZE
+        self.IO_BOUND = inner.IO_BOUND
+        # Entry id -> (vector, norm, result), most recently used last; the
+        # thread pool of analyze_multiple_gaps shares it, hence the lock
+        self._entries: OrderedDict = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+    
+    def infer_gap(self, gap: DetectedGap, full_context: List[Dict] = None) -> InferenceResult:
+        """Serve a near-duplicate gap from the cache, else ask the wrapped inferencer"""
+        vector, norm = self._vectorize(gap)
+        cached = self._lookup(gap, vector, norm)
+        if cached:
+            return cached
+        return self._store(vector, norm, self.inner.infer_gap(gap, full_context))
+    
+    async def infer_gap_async(self, gap: DetectedGap, full_context: List[Dict] = None) -> InferenceResult:
+        """Async variant of infer_gap"""
+        vector, norm = self._vectorize(gap)
+        cached = self._lookup(gap, vector, norm)
+        if cached:
+            return cached
+        return self._store(vector, norm, await self.inner.infer_gap_async(gap, full_context))
+    
+    async def infer_gap_stream(
+        self, gap: DetectedGap, full_context: List[Dict] = None
+    ) -> AsyncIterator[InferenceResult]:
+        """Yield a cached near-duplicate, else the wrapped stream, caching its final result"""
+        vector, norm = self._vectorize(gap)
+        cached = self._lookup(gap, vector, norm)
+        if cached:
+            yield cached
+            return
+        
+        result = None
+        async for result in self.inner.infer_gap_stream(gap, full_context):
+            yield result
+        if result is not None:
+            self._store(vector, norm, result)
+    
+    def infer_gaps_batched(self, gaps: List[DetectedGap], full_context: List[Dict] = None) -> List[InferenceResult]:
+        """Answer cached gaps locally and batch only the misses"""
+        results, misses = self._split_hits(gaps)
+        fresh = self.inner.infer_gaps_batched([gaps[i] for i, _, _ in misses], full_context)
+        return self._merge(results, misses, fresh)
+    
+    async def infer_gaps_batched_async(
+        self, gaps: List[DetectedGap], full_context: List[Dict] = None
+    ) -> List[InferenceResult]:
+        """Async variant of infer_gaps_batched"""
+        results, misses = self._split_hits(gaps)
+        fresh = await self.inner.infer_gaps_batched_async([gaps[i] for i, _, _ in misses], full_context)
+        return self._merge(results, misses, fresh)
+    
+    def generate_anchors(self, gap: DetectedGap) -> List[Dict]:
+        """Anchors in the wrapped inferencer's format"""
+        return self.inner.generate_anchors(gap)
+    
+    def result_version(self) -> str:
+        """The wrapped inferencer's version"""
+        return self.inner.result_version()
+    
+    def preload_transcript(self, full_context: List[Dict]):
+        """Preload the transcript in the wrapped inferencer"""
+        self.inner.preload_transcript(full_context)
+    
+    def release_transcript(self, full_context: List[Dict]):
+        """Release the transcript in the wrapped inferencer"""
+        self.inner.release_transcript(full_context)
+    
+    async def aclose(self):
+        """Release the wrapped inferencer's resources"""
+        await self.inner.aclose()
+    
+    def _split_hits(self, gaps: List[DetectedGap]):
+        """Cached results by position, plus (index, vector, norm) for each miss"""
+        results = [None] * len(gaps)
+        misses = []
+        for i, gap in enumerate(gaps):
+            vector, norm = self._vectorize(gap)
+            results[i] = self._lookup(gap, vector, norm)
+            if not results[i]:
+                misses.append((i, vector, norm))
+        return results, misses
+    
+    def _merge(self, results: List, misses: List, fresh: List[InferenceResult]) -> List[InferenceResult]:
+        """Fill the missed positions with fresh results and cache them"""
+        for (i, vector, norm), result in zip(misses, fresh):
+            results[i] = self._store(vector, norm, result)
+        return results
+    
+    def _vectorize(self, gap: DetectedGap) -> Tuple[Counter, float]:
+        """Bag-of-words term counts for a gap, with their Euclidean norm"""
+        parts = [m.get("content") or "" for m in gap.context_before]
+        parts += [m.get("content") or "" for m in gap.context_after]
+        parts += gap.suspicion_reasons
+        vector = Counter(self._WORD_RE.findall(" ".join(parts).lower()))
+        return vector, math.sqrt(sum(c * c for c in vector.values()))
+    
+    def _lookup(self, gap: DetectedGap, vector: Counter, norm: float) -> Optional[InferenceResult]:
+        """Best cached result at or above the similarity threshold, anchored to this gap"""
+        if not norm:
+            return None
+        with self._lock:
+            best_key, best_score = None, self.threshold
+            for key, (other, other_norm, _) in self._entries.items():
+                small, large = (vector, other) if len(vector) <= len(other) else (other, vector)
+                dot = sum(count * large[term] for term, count in small.items() if term in large)
+                score = dot / (norm * other_norm)
+                if score >= best_score:
+                    best_key, best_score = key, score
+            if best_key is None:
+                return None
+            self._entries.move_to_end(best_key)
+            result = self._entries[best_key][2]
+        
+        # The cached anchors point at the other gap's messages
+        return replace(
+            result,
+            context_anchors=self.inner.generate_anchors(gap),
+            hallucination_flags=result.hallucination_flags + [self.HIT_FLAG],
+        )
+    
+    def _store(self, vector: Counter, norm: float, result: InferenceResult) -> InferenceResult:
+        """Remember a fresh result (unless it came from a failed API call)"""
+        if norm and _is_cacheable(result):
+            with self._lock:
+                self._entries[self._next_id] = (vector, norm, result)
+                self._next_id += 1
+                if len(self._entries) > self.MAX_ENTRIES:
+                    self._entries.popitem(last=False)
+        return result
 
-### Langkah 3: Evaluasi Kepercayaan
-- 0.1-0.3: Hanya dugaan berdasarkan durasi gap
-- 0.4-0.5: Ada indikasi lemah dari perubahan topik
-- 0.6-0.7: Ada bukti jelas (pertanyaan tanpa jawaban, dll)
-- 0.8-1.0: HANYA jika ada pesan "dihapus" eksplisit
 
-### Langkah 4: Flag Semua Spekulasi
-- Tandai SETIAP aspek prediksi yang tidak bisa dibuktikan 100%
+class PersistentInferenceCache(BaseInferencer):
+    """
+    Reuses inferences for gaps with the same normalized context
+    
+    The key is a blake2b hash of the wrapped inferencer's result_version
+    (model and prompt), the senders and case/whitespace-normalized contents
+    around the gap, the gap length in 5-minute buckets and the detection
+    type, so re-analysing a chat skips the API while a model or prompt
+    change does not reuse old answers. Results live in an in-process LRU
+    and, when a path is given, in a SQLite file that survives restarts;
+    both expire after ttl seconds. Hits are flagged PERSISTENT_CACHE_HIT.
+    """
+    
+    MAX_ENTRIES = 1024
+    GAP_BUCKET_SECONDS = 300
+    HIT_FLAG = "PERSISTENT_CACHE_HIT"
+    
+    def __init__(self, inner: BaseInferencer, path: Optional[str] = None, ttl: int = 7 * 24 * 3600):
+        self.inner = inner
+        self.ttl = ttl
+        self.BATCH_SIZE = inner.BATCH_SIZE
+        self.IO_BOUND = inner.IO_BOUND
+        self._version = inner.result_version()
+        # Key -> (InferenceResult, expires_at), most recently used last
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS inferences "
+                "(key TEXT PRIMARY KEY, result BLOB NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.commit()
+    
+    def infer_gap(self, gap: DetectedGap, full_context: List[Dict] = None) -> InferenceResult:
+        """Serve a gap with a known context from the cache, else ask the wrapped inferencer"""
+        return self.infer_gaps_batched([gap], full_context)[0]
+    
+    async def infer_gap_async(self, gap: DetectedGap, full_context: List[Dict] = None) -> InferenceResult:
+        """Async variant of infer_gap"""
+        return (await self.infer_gaps_batched_async([gap], full_context))[0]
+    
+    async def infer_gap_stream(
+        self, gap: DetectedGap, full_context: List[Dict] = None
+    ) -> AsyncIterator[InferenceResult]:
+        """Yield the cached result, else the wrapped stream, caching its final result"""
+        results, misses = await self._off_loop(self._split_hits, [gap])
+        if not misses:
+            yield results[0]
+            return
+        
+        result = None
+        async for result in self.inner.infer_gap_stream(gap, full_context):
+            yield result
+        if result is not None:
+            await self._off_loop(self._merge, results, misses, [result])
+    
+    def infer_gaps_batched(self, gaps: List[DetectedGap], full_context: List[Dict] = None) -> List[InferenceResult]:
+        """Answer cached gaps locally and batch only the misses"""
+        results, misses = self._split_hits(gaps)
+        if not misses:
+            return results
+        fresh = self.inner.infer_gaps_batched([gaps[i] for i, _ in misses], full_context)
+        return self._merge(results, misses, fresh)
+    
+    async def infer_gaps_batched_async(
+        self, gaps: List[DetectedGap], full_context: List[Dict] = None
+    ) -> List[InferenceResult]:
+        """Async variant of infer_gaps_batched (SQLite access runs in a worker thread)"""
+        results, misses = await self._off_loop(self._split_hits, gaps)
+        if not misses:
+            return results
+        fresh = await self.inner.infer_gaps_batched_async([gaps[i] for i, _ in misses], full_context)
+        return await self._off_loop(self._merge, results, misses, fresh)
+    
+    def generate_anchors(self, gap: DetectedGap) -> List[Dict]:
+        """Anchors in the wrapped inferencer's format"""
+        return self.inner.generate_anchors(gap)
+    
+    def result_version(self) -> str:
+        """The wrapped inferencer's version"""
+        return self.inner.result_version()
+    
+    def preload_transcript(self, full_context: List[Dict]):
+        """Preload the transcript in the wrapped inferencer"""
+        self.inner.preload_transcript(full_context)
+    
+    def release_transcript(self, full_context: List[Dict]):
+        """Release the transcript in the wrapped inferencer"""
+        self.inner.release_transcript(full_context)
+    
+    async def aclose(self):
+        """Close the SQLite file and the wrapped inferencer"""
+        if self._db is not None:
+            with self._lock:
+                self._db.close()
+                self._db = None
+        await self.inner.aclose()
+    
+    async def _off_loop(self, func, *args):
+        """Run a cache step in a worker thread when it may touch the SQLite file"""
+        if self._db is None:
+            return func(*args)
+        return await asyncio.to_thread(func, *args)
+    
+    def _key(self, gap: DetectedGap) -> str:
+        """Stable hash of the gap's normalized context"""
+        def normalize(messages: List[Dict]) -> List[Tuple]:
+            return [
+                (m.get("sender"), " ".join((m.get("content") or "").lower().split()))
+                for m in messages
+            ]
+        
+        canonical = orjson.dumps([
+            self._version,
+            normalize(gap.context_before),
+            normalize(gap.context_after),
+            int(gap.time_gap_seconds) // self.GAP_BUCKET_SECONDS,
+            gap.detection_type,
+        ])
+        return hashlib.blake2b(canonical, digest_size=16).hexdigest()
+    
+    def _split_hits(self, gaps: List[DetectedGap]):
+        """Cached results by position, plus (index, key) for each miss"""
+        results = [None] * len(gaps)
+        misses = []
+        for i, gap in enumerate(gaps):
+            key = self._key(gap)
+            cached = self._lookup(key)
+            if cached:
+                # Anchors point at this gap's messages, not the cached one's
+                results[i] = replace(
+                    cached,
+                    context_anchors=self.inner.generate_anchors(gap),
+                    hallucination_flags=cached.hallucination_flags + [self.HIT_FLAG],
+                )
+            else:
+                misses.append((i, key))
+        return results, misses
+    
+    def _merge(self, results: List, misses: List, fresh: List[InferenceResult]) -> List[InferenceResult]:
+        """Fill the missed positions with fresh results and cache them"""
+        rows = []
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            for (i, key), result in zip(misses, fresh):
+                results[i] = result
+                if not _is_cacheable(result):
+                    continue  # Never cache failed API calls
+                self._remember(key, result, expires_at)
+                rows.append((key, orjson.dumps(result.to_dict()), expires_at))
+            if rows and self._db is not None:
+                self._db.executemany("INSERT OR REPLACE INTO inferences VALUES (?, ?, ?)", rows)
+                self._db.commit()
+        return results
+    
+    def _lookup(self, key: str) -> Optional[InferenceResult]:
+        """Unexpired result from memory, else from the SQLite file"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                result, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    return result
+                del self._entries[key]
+            if self._db is None:
+                return None
+            row = self._db.execute(
+                "SELECT result, expires_at FROM inferences WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+            if row is None:
+                return None
+            result = InferenceResult(**orjson.loads(row[0]))
+            self._remember(key, result, row[1])
+            return result
+    
+    def _remember(self, key: str, result: InferenceResult, expires_at: float):
+        """Add to the in-process LRU (caller holds the lock)"""
+        self._entries[key] = (result, expires_at)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.MAX_ENTRIES:
+            self._entries.popitem(last=False)
 
-## FORMAT RESPONS (JSON)
-{{
-    "predicted_intent": "Deskripsi SINGKAT dan KONSERVATIF (atau null jika tidak cukup bukti)",
-    "predicted_content": null,
-    "predicted_sender": "Nama pengirim HANYA jika bisa ditentukan dari pola gilir bicara (atau null)",
-    "confidence_score": 0.5,
-    "reasoning": "Langkah-langkah analisis Anda dengan KUTIPAN SPESIFIK dari konteks sebagai bukti",
-    "hallucination_flags": ["WAJIB ISI - minimal 'INFERENCE_BASED' jika ada prediksi apapun"]
-}}
 
-## CONTOH RESPONS KONSERVATIF
-Jika tidak ada bukti kuat:
-{{
-    "predicted_intent": null,
-    "predicted_content": null,
-    "predicted_sender": null,
-    "confidence_score": 0.2,
-    "reasoning": "Gap terdeteksi tetapi tidak ada bukti linguistik yang cukup untuk memprediksi isi pesan. Perubahan topik bisa disebabkan oleh jeda waktu natural.",
-    "hallucination_flags": ["NO_EVIDENCE", "TIME_GAP_ONLY"]
-}}
-"""
+class TranscriptSession:
+    """
+    Gap analyses that share one preloaded transcript
+    
+    Entering the session renders the transcript prefix once and, for
+    Gemini, creates its CachedContent, so every gap request afterwards only
+    sends its own section. The transcript list must not change while the
+    session is open.
+    """
+    
+    def __init__(self, ai: "AIInferencer", full_context: List[Dict]):
+        self.ai = ai
+        self.full_context = full_context
+    
+    def __enter__(self) -> "TranscriptSession":
+        self.ai.inferencer.preload_transcript(self.full_context)
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.ai.inferencer.release_transcript(self.full_context)
+    
+    async def __aenter__(self) -> "TranscriptSession":
+        # Cache creation is a blocking API call
+        await asyncio.to_thread(self.ai.inferencer.preload_transcript, self.full_context)
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        self.ai.inferencer.release_transcript(self.full_context)
+    
+    def analyze_gap(self, gap: DetectedGap) -> InferenceResult:
+        """Analyze one gap of the transcript"""
+        return self.ai.analyze_gap(gap, self.full_context)
+    
+    async def analyze_gap_async(self, gap: DetectedGap) -> InferenceResult:
+        """Analyze one gap of the transcript without blocking the event loop"""
+        return await self.ai.analyze_gap_async(gap, self.full_context)
+    
+    def analyze_multiple_gaps(
+        self, gaps: List[DetectedGap], concurrency: Optional[int] = None
+    ) -> List[InferenceResult]:
+        """Analyze several gaps of the transcript, in input order"""
+        return self.ai.analyze_multiple_gaps(gaps, self.full_context, concurrency)
+    
+    async def analyze_multiple_gaps_async(
+        self, gaps: List[DetectedGap], concurrency: Optional[int] = None
+    ) -> List[InferenceResult]:
+        """Analyze several gaps of the transcript concurrently, in input order"""
+        return await self.ai.analyze_multiple_gaps_async(gaps, self.full_context, concurrency)
 
 
 class AIInferencer:
@@ -476,32 +1662,117 @@ class AIInferencer:
     """
     
     def __init__(self):
-        settings = get_settings()
-        
         if settings.use_mock_ai:
-            self.inferencer = MockInferencer()
+            self.inferencer = MockInferencer(seed=settings.mock_seed)
         else:
             self.inferencer = GeminiInferencer(
                 api_key=settings.gemini_api_key,
                 model=settings.gemini_model,
+                requests_per_minute=settings.gemini_rpm,
+            )
+        
+        self._model_info = {
+            "implementation": type(self.inferencer).__name__,
+            "model": getattr(self.inferencer, 'model', 'mock'),
+            "is_mock": isinstance(self.inferencer, MockInferencer),
+        }
+        
+        if settings.inference_cache and not self._model_info["is_mock"]:
+            self.inferencer = PersistentInferenceCache(
+                self.inferencer,
+                path=settings.inference_cache_path,
+                ttl=settings.inference_cache_ttl,
+            )
+        
+        if settings.semantic_cache:
+            self.inferencer = SemanticInferenceCache(
+                self.inferencer, threshold=settings.semantic_cache_threshold
             )
     
     def analyze_gap(self, gap: DetectedGap, full_context: List[Dict] = None) -> InferenceResult:
         """Analyze a gap and generate inference"""
         return self.inferencer.infer_gap(gap, full_context)
     
+    async def analyze_gap_async(self, gap: DetectedGap, full_context: List[Dict] = None) -> InferenceResult:
+        """Analyze a gap without blocking the event loop"""
+        return await self.inferencer.infer_gap_async(gap, full_context)
+    
+    def analyze_gap_stream(
+        self, gap: DetectedGap, full_context: List[Dict] = None
+    ) -> AsyncIterator[InferenceResult]:
+        """Analyze a gap, yielding partial results before the final one"""
+        return self.inferencer.infer_gap_stream(gap, full_context)
+    
     def analyze_multiple_gaps(
         self, 
         gaps: List[DetectedGap], 
-        full_context: List[Dict] = None
+        full_context: List[Dict] = None,
+        concurrency: Optional[int] = None,
     ) -> List[InferenceResult]:
-        """Analyze multiple gaps"""
-        return [self.analyze_gap(gap, full_context) for gap in gaps]
+        """
+        Analyze multiple gaps, BATCH_SIZE gaps per request, in input order
+        
+        Network-bound batches run on up to `concurrency` threads (default:
+        settings.inference_concurrency); CPU-bound ones (the mock) run
+        serially, since threads would only contend for the GIL.
+        """
+        size = self.inferencer.BATCH_SIZE
+        batches = [gaps[start:start + size] for start in range(0, len(gaps), size)]
+        
+        def run(batch: List[DetectedGap]) -> List[InferenceResult]:
+            return self.inferencer.infer_gaps_batched(batch, full_context)
+        
+        if len(batches) < 2 or not self.inferencer.IO_BOUND:
+            return [result for batch in batches for result in run(batch)]
+        
+        workers = min(concurrency or settings.inference_concurrency, len(batches))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return [result for batch in executor.map(run, batches) for result in batch]
+    
+    async def analyze_multiple_gaps_async(
+        self,
+        gaps: List[DetectedGap],
+        full_context: List[Dict] = None,
+        concurrency: Optional[int] = None,
+    ) -> List[InferenceResult]:
+        """
+        Analyze multiple gaps concurrently, in input order
+        
+        Gaps are grouped BATCH_SIZE per request; at most `concurrency`
+        requests (default: settings.inference_concurrency) are in flight at
+        once to stay within API rate limits.
+        """
+        semaphore = asyncio.Semaphore(concurrency or settings.inference_concurrency)
+        size = self.inferencer.BATCH_SIZE
+        
+        async def run(batch: List[DetectedGap]) -> List[InferenceResult]:
+            async with semaphore:
+                return await self.inferencer.infer_gaps_batched_async(batch, full_context)
+        
+        batches = await asyncio.gather(*(run(gaps[start:start + size]) for start in range(0, len(gaps), size)))
+        return [result for batch in batches for result in batch]
+    
+    def open_transcript(self, full_context: List[Dict]) -> TranscriptSession:
+        """Session for analyzing many gaps of the same transcript (use as a context manager)"""
+        return TranscriptSession(self, full_context)
     
     def get_model_info(self) -> Dict:
         """Get information about the current model"""
-        return {
-            "implementation": type(self.inferencer).__name__,
-            "model": getattr(self.inferencer, 'model', 'mock'),
-            "is_mock": isinstance(self.inferencer, MockInferencer),
-        }
+        return dict(self._model_info)
+    
+    async def aclose(self):
+        """Release network resources (call once on application shutdown)"""
+        await self.inferencer.aclose()
+
+
+@lru_cache
+def get_inferencer() -> AIInferencer:
+    """Get the shared inferencer instance (configuration is fixed at startup)"""
+    return AIInferencer()
+
+
+async def close_inferencer():
+    """Close the shared inferencer if one was created"""
+    if get_inferencer.cache_info().currsize:
+        await get_inferencer().aclose()
+        get_inferencer.cache_clear()
@@ -2,11 +2,14 @@
 Gap Detection Engine
 Detects suspicious gaps and deletions in chat conversations
 """
-import json
+import math
 from datetime import datetime, timedelta
-from dataclasses import dataclass, asdict
-from typing import List, Optional
-from statistics import mean, stdev
+from dataclasses import dataclass
+from itertools import pairwise
+from typing import List, Optional, Tuple
+from statistics import fmean
+
+import orjson
 
 from app.services.parser import ParsedMessage
 
@@ -25,6 +28,22 @@ class DetectedGap:
     context_before: List[dict]
     context_after: List[dict]
     estimated_missing: Optional[int] = None
+    
+    def to_dict(self) -> dict:
+        """Shallow dict of the fields (asdict would deep-copy the context lists)"""
+        return {
+            "before_seq": self.before_seq,
+            "after_seq": self.after_seq,
+            "before_timestamp": self.before_timestamp,
+            "after_timestamp": self.after_timestamp,
+            "time_gap_seconds": self.time_gap_seconds,
+            "detection_type": self.detection_type,
+            "suspicion_score": self.suspicion_score,
+            "suspicion_reasons": self.suspicion_reasons,
+            "context_before": self.context_before,
+            "context_after": self.context_after,
+            "estimated_missing": self.estimated_missing,
+        }
 
 
 class GapDetector:
@@ -43,31 +62,83 @@ class GapDetector:
     MAX_NORMAL_GAP_HOURS = 8  # Maximum "normal" gap (e.g., sleep)
     CONTEXT_WINDOW = 3  # Messages before/after gap for context
     
+    # Context-mismatch keywords (tuples so prefix checks are one startswith call)
+    GREETINGS = ('hi', 'hello', 'hey', 'halo', 'hai', 'pagi', 'siang', 'sore', 'malam')
+    GOODBYES = ('bye', 'goodbye', 'see you', 'sampai', 'dah', 'dadah')
+    RESPONSES = ('ya', 'iya', 'yes', 'no', 'tidak', 'ok', 'oke', 'okay')
+    
     def __init__(self, messages: List[ParsedMessage]):
         self.messages = messages
         self.gaps: List[DetectedGap] = []
         self.avg_gap: float = 0
         self.gap_stdev: float = 0
         
+        # Seconds between consecutive messages, computed once and shared by
+        # the baseline and detect_all
+        self._gap_seconds: List[float] = [
+            (curr.timestamp - prev.timestamp).total_seconds()
+            for prev, curr in pairwise(messages)
+        ]
+        
+        # Context dict per message, built on first use and shared by the
+        # overlapping context windows of neighbouring gaps
+        self._context_entries: List[Optional[dict]] = [None] * len(messages)
+        
+        # Normalized content per message; each one is the "current" and then
+        # the "previous" side of a context-mismatch check
+        self._content_lower: List[str] = [
+            msg.content.lower().strip() if msg.content else "" for msg in messages
+        ]
+        
+        # Length of the same-sender run ending at each message
+        self._sender_runs: List[int] = []
+        run = 0
+        for prev, curr in zip([None] + messages, messages):
+            run = run + 1 if prev is not None and curr.sender == prev.sender else 1
+            self._sender_runs.append(run)
+        
         # Calculate baseline metrics
         self._calculate_baseline()
+        self._time_anomalies = self._time_anomaly_mask()
     
     def _calculate_baseline(self):
         """Calculate baseline gap statistics for the conversation"""
         if len(self.messages) < 2:
             return
         
-        gaps = []
-        for i in range(1, len(self.messages)):
-            gap = (self.messages[i].timestamp - self.messages[i-1].timestamp).total_seconds()
-            # Only include "normal" gaps (exclude obvious sleep/offline periods)
-            if gap < self.MAX_NORMAL_GAP_HOURS * 3600:
-                gaps.append(gap)
+        # Only include "normal" gaps (exclude obvious sleep/offline periods)
+        limit = self.MAX_NORMAL_GAP_HOURS * 3600
+        gaps = [gap for gap in self._gap_seconds if gap < limit]
         
+        # Float statistics with exact (fsum) summation; statistics.mean/stdev
+        # go through Fractions and dominated the baseline on long chats
         if gaps:
-            self.avg_gap = mean(gaps)
+            self.avg_gap = fmean(gaps)
             if len(gaps) > 1:
-                self.gap_stdev = stdev(gaps)
+                avg = self.avg_gap
+                self.gap_stdev = math.sqrt(math.fsum((gap - avg) ** 2 for gap in gaps) / (len(gaps) - 1))
+    
+    def _time_anomaly_mask(self) -> List[bool]:
+        """_is_time_anomaly for every consecutive pair, evaluated in one pass"""
+        is_anomaly = self._is_time_anomaly
+        return [is_anomaly(int(gap)) for gap in self._gap_seconds]
+    
+    def _candidate_indices(self) -> List[int]:
+        """
+        Indices where at least one detection strategy can fire
+        
+        A cheap necessary condition per strategy: a time anomaly, a deleted
+        neighbour, a greeting/response opener (context mismatch) or a
+        same-sender run of 4+ (pattern break). Everything else is skipped.
+        """
+        openers = self.GREETINGS + self.RESPONSES
+        deleted = [msg.is_deleted for msg in self.messages]
+        anomalies, runs, lowered = self._time_anomalies, self._sender_runs, self._content_lower
+        return [
+            i for i in range(1, len(self.messages))
+            if anomalies[i - 1] or deleted[i - 1] or deleted[i]
+            or runs[i] > 3 or lowered[i].startswith(openers)
+        ]
     
     def detect_all(self) -> List[DetectedGap]:
         """Run all gap detection strategies"""
@@ -76,18 +147,18 @@ class GapDetector:
         if len(self.messages) < 2:
             return self.gaps
         
-        for i in range(1, len(self.messages)):
+        for i in self._candidate_indices():
             prev_msg = self.messages[i-1]
             curr_msg = self.messages[i]
             
-            gap_seconds = int((curr_msg.timestamp - prev_msg.timestamp).total_seconds())
+            gap_seconds = int(self._gap_seconds[i - 1])
             
             # Collect all suspicious indicators
             suspicion_reasons = []
             detection_types = []
             
-            # Check for time anomaly
-            if self._is_time_anomaly(gap_seconds):
+            # Check for time anomaly (precomputed for every pair)
+            if self._time_anomalies[i - 1]:
                 detection_types.append("time_anomaly")
                 suspicion_reasons.append(f"Unusual gap of {gap_seconds//60} minutes detected")
             
@@ -114,6 +185,7 @@ class GapDetector:
                     detection_types, 
                     len(suspicion_reasons)
                 )
+                context_before, context_after = self._get_contexts(i)
                 
                 gap = DetectedGap(
                     before_seq=prev_msg.sequence_number,
@@ -124,8 +196,8 @@ class GapDetector:
                     detection_type=detection_types[0],  # Primary type
                     suspicion_score=score,
                     suspicion_reasons=suspicion_reasons,
-                    context_before=self._get_context(i, before=True),
-                    context_after=self._get_context(i, before=False),
+                    context_before=context_before,
+                    context_after=context_after,
                     estimated_missing=self._estimate_missing_messages(gap_seconds),
                 )
                 self.gaps.append(gap)
@@ -153,23 +225,16 @@ class GapDetector:
         if index < 1 or index >= len(self.messages):
             return False
         
-        prev_msg = self.messages[index - 1]
-        curr_msg = self.messages[index]
+        curr_lower = self._content_lower[index]
+        prev_lower = self._content_lower[index - 1]
         
         # Heuristic: If current message starts with a greeting after a non-goodbye message
-        greetings = ['hi', 'hello', 'hey', 'halo', 'hai', 'pagi', 'siang', 'sore', 'malam']
-        goodbyes = ['bye', 'goodbye', 'see you', 'sampai', 'dah', 'dadah']
-        
-        curr_lower = curr_msg.content.lower().strip()
-        prev_lower = prev_msg.content.lower().strip()
-        
-        # Starts with greeting but previous wasn't a goodbye
-        if any(curr_lower.startswith(g) for g in greetings):
-            if not any(g in prev_lower for g in goodbyes):
+        if curr_lower.startswith(self.GREETINGS):
+            if not any(g in prev_lower for g in self.GOODBYES):
                 return True
         
         # Response without question (simplified check)
-        if curr_lower.startswith(('ya', 'iya', 'yes', 'no', 'tidak', 'ok', 'oke', 'okay')):
+        if curr_lower.startswith(self.RESPONSES):
             if '?' not in prev_lower:
                 return True
         
@@ -183,20 +248,14 @@ class GapDetector:
         if index < 3:
             return None
         
-        # Get recent sender pattern
-        recent_senders = [m.sender for m in self.messages[max(0, index-5):index]]
         prev_sender = self.messages[index-1].sender
         curr_sender = self.messages[index].sender
         
         # Check if same sender messages in a row (unusual in conversation)
         if prev_sender == curr_sender:
-            # Count consecutive messages from same sender before gap
-            consecutive = 0
-            for j in range(index-1, max(0, index-10), -1):
-                if self.messages[j].sender == prev_sender:
-                    consecutive += 1
-                else:
-                    break
+            # Consecutive messages from same sender before gap, looking back
+            # over messages index-1 .. max(0, index-10)+1 (precomputed runs)
+            consecutive = min(self._sender_runs[index - 1], index - 1 - max(0, index - 10))
             
             # If sender had many messages and now continues after gap
             if consecutive >= 3:
@@ -240,27 +299,26 @@ class GapDetector:
         
         return min(score, 1.0)
     
-    def _get_context(self, index: int, before: bool) -> List[dict]:
-        """Get context messages before or after the gap"""
-        context = []
+    def _get_contexts(self, index: int) -> Tuple[List[dict], List[dict]]:
+        """Get the context messages before and after the gap in one pass"""
+        start = max(0, index - self.CONTEXT_WINDOW)
+        end = min(len(self.messages), index + self.CONTEXT_WINDOW)
         
-        if before:
-            start = max(0, index - self.CONTEXT_WINDOW)
-            end = index
-        else:
-            start = index
-            end = min(len(self.messages), index + self.CONTEXT_WINDOW)
-        
-        for i in range(start, end):
-            msg = self.messages[i]
-            context.append({
-                "sequence": msg.sequence_number,
-                "sender": msg.sender,
-                "content": msg.content[:200] if msg.content else "",  # Truncate for storage
-                "timestamp": msg.timestamp.isoformat(),
-            })
-        
-        return context
+        entries = self._context_entries
+        window = [entries[i] or self._context_entry(i) for i in range(start, end)]
+        split = index - start
+        return window[:split], window[split:]
+    
+    def _context_entry(self, i: int) -> dict:
+        """Build (once) the context dict for message i"""
+        msg = self.messages[i]
+        entry = self._context_entries[i] = {
+            "sequence": msg.sequence_number,
+            "sender": msg.sender,
+            "content": msg.content[:200] if msg.content else "",  # Truncate for storage
+            "timestamp": msg.timestamp.isoformat(),
+        }
+        return entry
     
     def _estimate_missing_messages(self, gap_seconds: int) -> Optional[int]:
         """Estimate number of missing messages based on average gap"""
@@ -277,4 +335,9 @@ class GapDetector:
     
     def to_json(self) -> str:
         """Serialize gaps to JSON"""
-        return json.dumps([asdict(g) for g in self.gaps], default=str)
+        # Datetimes pass through to default=str to keep their "YYYY-MM-DD HH:MM:SS" form
+        return orjson.dumps(
+            [g.to_dict() for g in self.gaps],
+            default=str,
+            option=orjson.OPT_PASSTHROUGH_DATETIME,
+        ).decode()
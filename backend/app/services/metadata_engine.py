@@ -2,16 +2,31 @@
 Metadata Extraction Engine
 Analyzes patterns from chat metadata for forensic insights
 """
+import math
 from datetime import datetime, timedelta
 from collections import Counter, defaultdict
 from dataclasses import dataclass
+from itertools import pairwise
 from typing import List, Dict, Optional, Tuple
-from statistics import mean, stdev
+from statistics import fmean, mean, stdev
 
 from app.services.parser import ParsedMessage
 
 
-@dataclass
+def _mean_stdev(values: List[float]) -> Tuple[float, float]:
+    """Mean and sample standard deviation in one pass (Welford's algorithm)"""
+    count = 0
+    avg = 0.0
+    sq_diffs = 0.0
+    for value in values:
+        count += 1
+        delta = value - avg
+        avg += delta / count
+        sq_diffs += delta * (value - avg)
+    return avg, math.sqrt(sq_diffs / (count - 1)) if count > 1 else 0.0
+
+
+@dataclass(slots=True)
 class SenderStats:
     """Statistics for a single sender"""
     name: str
@@ -23,7 +38,7 @@ class SenderStats:
     deleted_message_count: int
 
 
-@dataclass 
+@dataclass(slots=True)
 class ConversationPattern:
     """Detected conversation pattern"""
     pattern_type: str  # peak_hours, response_rhythm, topic_clusters
@@ -50,6 +65,15 @@ class MetadataEngine:
         # Group messages by sender
         for msg in messages:
             self.senders[msg.sender].append(msg)
+        
+        # Seconds between consecutive messages, shared by the analyses below
+        self._gap_seconds: List[float] = [
+            (curr.timestamp - prev.timestamp).total_seconds()
+            for prev, curr in pairwise(messages)
+        ]
+        
+        # Response times of every sender, collected in one pass on first use
+        self._response_times: Optional[Dict[str, List[float]]] = None
     
     def analyze_sender(self, sender: str) -> Optional[SenderStats]:
         """Analyze a specific sender's messaging patterns"""
@@ -57,21 +81,20 @@ class MetadataEngine:
         if not sender_msgs:
             return None
         
-        # Calculate message lengths
+        # Calculate message lengths (fmean: float sum instead of exact fractions)
         lengths = [len(m.content) for m in sender_msgs if m.content]
-        avg_length = mean(lengths) if lengths else 0
+        avg_length = fmean(lengths) if lengths else 0
         
         # Analyze active hours
-        hours = [m.timestamp.hour for m in sender_msgs]
-        hour_counts = Counter(hours)
+        hour_counts = Counter(m.timestamp.hour for m in sender_msgs)
         most_active = hour_counts.most_common(1)[0][0] if hour_counts else 12
         
         # Calculate average response time
         response_times = self._calculate_response_times(sender)
-        avg_response = mean(response_times) if response_times else None
+        avg_response = fmean(response_times) if response_times else None
         
         # Count deleted messages
-        deleted_count = sum(1 for m in sender_msgs if m.is_deleted)
+        deleted_count = sum(m.is_deleted for m in sender_msgs)
         
         return SenderStats(
             name=sender,
@@ -85,22 +108,16 @@ class MetadataEngine:
     
     def _calculate_response_times(self, sender: str) -> List[float]:
         """Calculate response times for a sender"""
-        response_times = []
-        
-        for i, msg in enumerate(self.messages):
-            if msg.sender != sender or i == 0:
-                continue
-            
-            prev_msg = self.messages[i - 1]
-            
-            # Only count if responding to different sender
-            if prev_msg.sender != sender:
-                response_time = (msg.timestamp - prev_msg.timestamp).total_seconds()
-                # Ignore very long gaps (likely not direct responses)
-                if response_time < 3600:  # 1 hour max
-                    response_times.append(response_time)
-        
-        return response_times
+        if self._response_times is None:
+            response_times = defaultdict(list)
+            for (prev_msg, msg), response_time in zip(pairwise(self.messages), self._gap_seconds):
+                # Only count if responding to different sender, ignoring very
+                # long gaps (likely not direct responses)
+                if msg.sender != prev_msg.sender and response_time < 3600:  # 1 hour max
+                    response_times[msg.sender].append(response_time)
+            self._response_times = response_times
+        
+        return self._response_times.get(sender, [])
     
     def analyze_all_senders(self) -> List[SenderStats]:
         """Analyze all senders in the conversation"""
@@ -190,48 +207,42 @@ class MetadataEngine:
         if len(self.messages) < 5:
             return None
         
-        bursts = []
-        current_burst = []
+        # Scan the precomputed gaps for [start, end) index spans; only the
+        # reported bursts are turned into dicts
+        spans = []
+        start = 0
         burst_threshold = 120  # 2 minutes between messages = same burst
         
-        for i, msg in enumerate(self.messages):
-            if i == 0:
-                current_burst = [msg]
-                continue
-            
-            gap = (msg.timestamp - self.messages[i-1].timestamp).total_seconds()
-            
-            if gap <= burst_threshold:
-                current_burst.append(msg)
-            else:
-                if len(current_burst) >= 5:  # Burst = 5+ rapid messages
-                    bursts.append({
-                        "start": current_burst[0].timestamp.isoformat(),
-                        "end": current_burst[-1].timestamp.isoformat(),
-                        "message_count": len(current_burst),
-                        "participants": list(set(m.sender for m in current_burst)),
-                    })
-                current_burst = [msg]
+        for i, gap in enumerate(self._gap_seconds, 1):
+            if gap > burst_threshold:
+                if i - start >= 5:  # Burst = 5+ rapid messages
+                    spans.append((start, i))
+                start = i
         
         # Don't forget last burst
-        if len(current_burst) >= 5:
-            bursts.append({
-                "start": current_burst[0].timestamp.isoformat(),
-                "end": current_burst[-1].timestamp.isoformat(),
-                "message_count": len(current_burst),
-                "participants": list(set(m.sender for m in current_burst)),
-            })
-        
-        if not bursts:
+        if len(self.messages) - start >= 5:
+            spans.append((start, len(self.messages)))
+        
+        if not spans:
             return None
         
         return ConversationPattern(
             pattern_type="conversation_bursts",
-            description=f"Detected {len(bursts)} intense conversation bursts",
+            description=f"Detected {len(spans)} intense conversation bursts",
             confidence=0.8,
-            data={"bursts": bursts[:10]}  # Limit to first 10
+            data={"bursts": [self._burst_summary(start, end) for start, end in spans[:10]]}  # Limit to first 10
         )
     
+    def _burst_summary(self, start: int, end: int) -> Dict:
+        """Describe the burst made of messages[start:end]"""
+        burst = self.messages[start:end]
+        return {
+            "start": burst[0].timestamp.isoformat(),
+            "end": burst[-1].timestamp.isoformat(),
+            "message_count": len(burst),
+            "participants": list(set(m.sender for m in burst)),
+        }
+    
     def find_anomalies(self) -> List[Dict]:
         """Find anomalous patterns that might indicate tampering"""
         anomalies = []
@@ -255,21 +266,16 @@ class MetadataEngine:
         if len(self.messages) < 10:
             return anomalies
         
-        # Calculate typical gaps
-        gaps = []
-        for i in range(1, len(self.messages)):
-            gap = (self.messages[i].timestamp - self.messages[i-1].timestamp).total_seconds()
-            gaps.append((i, gap))
-        
-        if not gaps:
+        # Typical gaps
+        gaps = self._gap_seconds
+        avg_gap, gap_stdev = _mean_stdev(gaps)
+        if gap_stdev <= 0:
             return anomalies
         
-        avg_gap = mean([g[1] for g in gaps])
-        gap_stdev = stdev([g[1] for g in gaps]) if len(gaps) > 1 else 0
-        
         # Find gaps that are statistical outliers
-        for i, gap in gaps:
-            if gap_stdev > 0 and gap > avg_gap + 3 * gap_stdev:
+        threshold = avg_gap + 3 * gap_stdev
+        for i, gap in enumerate(gaps, 1):
+            if gap > threshold:
                 anomalies.append({
                     "type": "unusual_silence",
                     "position": i,
@@ -288,14 +294,14 @@ class MetadataEngine:
             if len(msgs) < 10:
                 continue
             
-            # Split messages into two halves and compare patterns
-            mid = len(msgs) // 2
-            first_half = msgs[:mid]
-            second_half = msgs[mid:]
+            # Split messages into two halves and compare patterns, over one
+            # list of lengths (0 for empty content, which is left out)
+            lengths = [len(m.content) if m.content else 0 for m in msgs]
+            mid = len(lengths) // 2
             
             # Compare message lengths
-            avg_first = mean(len(m.content) for m in first_half if m.content) or 0
-            avg_second = mean(len(m.content) for m in second_half if m.content) or 0
+            avg_first = fmean(n for n in lengths[:mid] if n) or 0
+            avg_second = fmean(n for n in lengths[mid:] if n) or 0
             
             # Significant change in message length
             if avg_first > 0 and abs(avg_second - avg_first) / avg_first > 0.5:
@@ -3,12 +3,32 @@ WhatsApp Chat Parser
 Parses WhatsApp exported .txt chat files into structured data
 """
 import re
+import codecs
 from datetime import datetime
 from dataclasses import dataclass
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple, Iterable, Iterator, BinaryIO
 
 
-@dataclass
+# Message header for every supported export format, compiled once at import.
+# One alternative per format (4 groups each: date, time, sender, content);
+# whitespace classes exclude newlines so a match never spans lines.
+_HEADER_RE = re.compile(
+    r'^[^\S\n]*(?:'
+    # Format: DD/MM/YYYY, HH:MM - Sender: Message
+    r'(\d{1,2}/\d{1,2}/\d{2,4}),?[^\S\n]+(\d{1,2}:\d{2}(?::\d{2})?(?:[^\S\n]*[APap][Mm])?)'
+    r'[^\S\n]*[-–][^\S\n]*([^:\n]+):[^\S\n]*(.*)'
+    # Format: [DD/MM/YYYY, HH:MM:SS] Sender: Message
+    r'|\[(\d{1,2}/\d{1,2}/\d{2,4}),?[^\S\n]+(\d{1,2}:\d{2}:\d{2})\][^\S\n]*([^:\n]+):[^\S\n]*(.*)'
+    # Format: YYYY-MM-DD HH:MM:SS - Sender: Message
+    r'|(\d{4}-\d{2}-\d{2})[^\S\n]+(\d{2}:\d{2}:\d{2})[^\S\n]*[-–][^\S\n]*([^:\n]+):[^\S\n]*(.*)'
+    r')$',
+    re.MULTILINE,
+)
+
+_LEADING_SPACE_RE = re.compile(r'\s*')
+
+
+@dataclass(slots=True)
 class ParsedMessage:
     """Represents a parsed message from WhatsApp export"""
     timestamp: datetime
@@ -30,54 +50,57 @@ class WhatsAppParser:
     - [DD/MM/YYYY, HH:MM:SS] Sender: Message
     """
     
-    # Multiple regex patterns for different WhatsApp export formats
-    PATTERNS = [
-        # Format: DD/MM/YYYY, HH:MM - Sender: Message
-        re.compile(
-            r'^(\d{1,2}/\d{1,2}/\d{2,4}),?\s+(\d{1,2}:\d{2}(?::\d{2})?(?:\s*[APap][Mm])?)\s*[-–]\s*([^:]+):\s*(.*)$'
-        ),
-        # Format: [DD/MM/YYYY, HH:MM:SS] Sender: Message
-        re.compile(
-            r'^\[(\d{1,2}/\d{1,2}/\d{2,4}),?\s+(\d{1,2}:\d{2}:\d{2})\]\s*([^:]+):\s*(.*)$'
-        ),
-        # Format: YYYY-MM-DD HH:MM:SS - Sender: Message
-        re.compile(
-            r'^(\d{4}-\d{2}-\d{2})\s+(\d{2}:\d{2}:\d{2})\s*[-–]\s*([^:]+):\s*(.*)$'
-        ),
-    ]
-    
-    # System message patterns (not from a sender)
-    SYSTEM_PATTERNS = [
-        re.compile(r'Messages and calls are end-to-end encrypted', re.IGNORECASE),
-        re.compile(r'created group', re.IGNORECASE),
-        re.compile(r'added you', re.IGNORECASE),
-        re.compile(r'changed the subject', re.IGNORECASE),
-        re.compile(r'left the group', re.IGNORECASE),
-        re.compile(r'removed \w+', re.IGNORECASE),
-    ]
-    
-    # Deleted message patterns
-    DELETED_PATTERNS = [
-        re.compile(r'^This message was deleted\.?$', re.IGNORECASE),
-        re.compile(r'^You deleted this message\.?$', re.IGNORECASE),
-        re.compile(r'^Pesan ini telah dihapus\.?$', re.IGNORECASE),  # Indonesian
-    ]
-    
-    # Media patterns
-    MEDIA_PATTERNS = [
-        re.compile(r'<Media omitted>', re.IGNORECASE),
-        re.compile(r'\(file attached\)', re.IGNORECASE),
-        re.compile(r'image omitted', re.IGNORECASE),
-        re.compile(r'video omitted', re.IGNORECASE),
-        re.compile(r'audio omitted', re.IGNORECASE),
-        re.compile(r'GIF omitted', re.IGNORECASE),
-        re.compile(r'sticker omitted', re.IGNORECASE),
-    ]
+    # System message markers (not from a sender), matched against the
+    # lowercased content; plain substrings beat case-insensitive regexes
+    SYSTEM_MARKERS = (
+        'messages and calls are end-to-end encrypted',
+        'created group',
+        'added you',
+        'changed the subject',
+        'left the group',
+    )
+    SYSTEM_REMOVED = re.compile(r'removed \w+')
+    
+    # Deleted message placeholders, lowercased with and without the final
+    # period; the whole content must match, so a set lookup replaces a regex
+    DELETED_MESSAGES = frozenset(
+        text + suffix
+        for text in (
+            'this message was deleted',
+            'you deleted this message',
+            'pesan ini telah dihapus',  # Indonesian
+        )
+        for suffix in ('', '.')
+    )
+    
+    # Media markers, matched against the lowercased content
+    MEDIA_MARKERS = (
+        '<media omitted>',
+        '(file attached)',
+        'image omitted',
+        'video omitted',
+        'audio omitted',
+        'gif omitted',
+        'sticker omitted',
+    )
     
     def __init__(self):
         self.messages: List[ParsedMessage] = []
+        self._reset()
+    
+    def _reset(self):
+        """Reset per-parse state (participants, errors and running stats)"""
         self.participants: set = set()
         self.parse_errors: List[Tuple[int, str]] = []
+        self.message_count = 0
+        self.deleted_count = 0
+        self.media_count = 0
+        self.start_timestamp: Optional[datetime] = None
+        self.end_timestamp: Optional[datetime] = None
+        self._datetime_format: Optional[str] = None
+        # Raw sender capture -> stripped name, so every message from one
+        # participant shares a single string object
+        self._sender_names: Dict[str, str] = {}
     
     def parse(self, content: str) -> List[ParsedMessage]:
         """
@@ -89,90 +112,167 @@ class WhatsAppParser:
         Returns:
             List of ParsedMessage objects
         """
-        self.messages = []
-        self.participants = set()
-        self.parse_errors = []
+        # Scan the content in place rather than a stripped copy: trailing
+        # blank lines are skipped anyway, and leading ones only shift the
+        # line numbers of parse errors, so numbering starts past them
+        leading = _LEADING_SPACE_RE.match(content).end()
+        first_line = 1 - content.count('\n', 0, leading)
+        self.messages = list(self.parse_iter([content], first_line=first_line))
+        return self.messages
+    
+    def parse_file(self, path: str, encoding: str = "utf-8") -> List[ParsedMessage]:
+        """
+        Parse an export file from disk without reading it into one string
         
-        lines = content.strip().split('\n')
+        The file is decoded in chunks of whole lines and fed to parse_iter,
+        so only the parsed messages are held in memory.
+        """
+        with open(path, "rb") as stream:
+            self.messages = list(self.parse_iter(iter_decoded_chunks(stream, encoding)))
+        return self.messages
+    
+    def parse_iter(self, chunks: Iterable[str], first_line: int = 1) -> Iterator[ParsedMessage]:
+        """
+        Lazily parse text chunks, yielding each message once it is complete
+        
+        Each chunk holds one or more whole lines (a plain list of lines
+        works too). Headers are found with a single finditer scan per chunk;
+        the text between two headers is the continuation of the first.
+        
+        Messages are not retained; participants, time range and stats are
+        tracked as the chunks are consumed, so large exports can be
+        processed without holding the whole chat in memory.
+        
+        first_line is the line number reported in parse_errors for the
+        first line of the first chunk.
+        """
+        self._reset()
+        sender_names = self._sender_names
         current_message = None
         sequence = 0
+        line_offset = first_line - 1
         
-        for line_num, line in enumerate(lines, 1):
-            line = line.strip()
-            if not line:
-                continue
-            
-            # Try to parse as new message
-            parsed = self._try_parse_line(line)
-            
-            if parsed:
-                # Save previous message if exists
+        for chunk in chunks:
+            pos = 0
+            for match in _HEADER_RE.finditer(chunk):
+                # Each format contributes 4 groups; content is always last
+                first = match.lastindex - 3
+                date_str, time_str, sender, content_text = match.group(
+                    first, first + 1, first + 2, first + 3
+                )
+                timestamp = self._parse_datetime(date_str, time_str)
+                if not timestamp:
+                    # Header-like line with an invalid date: keep as text
+                    continue
+                
+                self._add_continuation(current_message, chunk, pos, match.start(), line_offset)
+                
+                # Emit previous message if exists
                 if current_message:
-                    self.messages.append(current_message)
+                    yield current_message
                 
                 sequence += 1
-                timestamp, sender, content_text = parsed
+                content_text = content_text.rstrip()
+                name = sender_names.get(sender)
+                if name is None:
+                    name = sender_names[sender] = sender.strip()
                 
                 # Detect message type
                 msg_type, is_deleted, has_media = self._classify_message(content_text)
                 
                 current_message = ParsedMessage(
                     timestamp=timestamp,
-                    sender=sender,
+                    sender=name,
                     content=content_text,
                     sequence_number=sequence,
                     message_type=msg_type,
                     is_deleted=is_deleted,
                     has_media=has_media,
                 )
-                self.participants.add(sender)
-            else:
-                # Continuation of previous message (multi-line)
-                if current_message:
-                    current_message.content += f"\n{line}"
-                else:
-                    # Line at start that doesn't match pattern
-                    self.parse_errors.append((line_num, line))
+                self._track(current_message)
+                pos = match.end()
+            
+            self._add_continuation(current_message, chunk, pos, len(chunk), line_offset)
+            line_offset += chunk.count('\n') + 1
         
         # Don't forget the last message
         if current_message:
-            self.messages.append(current_message)
-        
-        return self.messages
+            yield current_message
     
-    def _try_parse_line(self, line: str) -> Optional[Tuple[datetime, str, str]]:
-        """Try to parse a line using various patterns"""
-        for pattern in self.PATTERNS:
-            match = pattern.match(line)
-            if match:
-                groups = match.groups()
-                date_str = groups[0]
-                time_str = groups[1]
-                sender = groups[2].strip()
-                content = groups[3] if len(groups) > 3 else ""
-                
-                timestamp = self._parse_datetime(date_str, time_str)
-                if timestamp:
-                    return timestamp, sender, content
+    def _add_continuation(
+        self,
+        message: Optional[ParsedMessage],
+        chunk: str,
+        start: int,
+        end: int,
+        line_offset: int,
+    ):
+        """Append the non-header lines in chunk[start:end] to a message"""
+        if start >= end:
+            return
+        lines = chunk[start:end].split('\n')
+        if message:
+            # Continuation of previous message (multi-line), joined once
+            # rather than growing the content string line by line
+            stripped = [line.strip() for line in lines]
+            message.content = "\n".join([message.content, *filter(None, stripped)])
+            return
         
-        return None
+        first_line = None
+        for index, line in enumerate(lines):
+            line = line.strip()
+            if not line:
+                continue
+            # Line at start that doesn't match pattern
+            if first_line is None:
+                first_line = line_offset + chunk.count('\n', 0, start) + 1
+            self.parse_errors.append((first_line + index, line))
+    
+    def _track(self, message: ParsedMessage):
+        """Update running participants, time range and counters"""
+        self.participants.add(message.sender)
+        self.message_count += 1
+        if message.is_deleted:
+            self.deleted_count += 1
+        if message.has_media:
+            self.media_count += 1
+        if self.start_timestamp is None:
+            self.start_timestamp = message.timestamp
+        self.end_timestamp = message.timestamp
+    
+    # Supported timestamp layouts. At most one can accept a given header
+    # (they differ in year width, seconds or AM/PM), so trying the last
+    # successful one first gives the same result as trying them in order.
+    DATETIME_FORMATS = (
+        "%d/%m/%Y %H:%M",
+        "%d/%m/%y %H:%M",
+        "%m/%d/%Y %I:%M %p",
+        "%m/%d/%y %I:%M %p",
+        "%Y-%m-%d %H:%M:%S",
+        "%d/%m/%Y %H:%M:%S",
+    )
     
     def _parse_datetime(self, date_str: str, time_str: str) -> Optional[datetime]:
         """Parse date and time strings into datetime object"""
-        formats = [
-            ("%d/%m/%Y %H:%M", f"{date_str} {time_str}"),
-            ("%d/%m/%y %H:%M", f"{date_str} {time_str}"),
-            ("%m/%d/%Y %I:%M %p", f"{date_str} {time_str}"),
-            ("%m/%d/%y %I:%M %p", f"{date_str} {time_str}"),
-            ("%Y-%m-%d %H:%M:%S", f"{date_str} {time_str}"),
-            ("%d/%m/%Y %H:%M:%S", f"{date_str} {time_str}"),
-        ]
+        # DD/MM/YYYY HH:MM (the common export layout) without strptime
+        date_parts = date_str.split('/')
+        if len(date_parts) == 3 and len(date_parts[2]) == 4 and time_str.count(':') == 1 and time_str[-1].isdigit():
+            day, month, year = date_parts
+            hour, minute = time_str.split(':')
+            try:
+                return datetime(int(year), int(month), int(day), int(hour), int(minute))
+            except ValueError:
+                return None
         
-        for fmt, dt_str in formats:
+        dt_str = f"{date_str} {time_str}".strip()
+        last = self._datetime_format
+        for fmt in (last, *self.DATETIME_FORMATS) if last else self.DATETIME_FORMATS:
             try:
-                return datetime.strptime(dt_str.strip(), fmt)
+                parsed = datetime.strptime(dt_str, fmt)
             except ValueError:
                 continue
+            self._datetime_format = fmt
+            return parsed
         
         return None
     
@@ -183,20 +283,23 @@ class WhatsAppParser:
         Returns:
             Tuple of (message_type, is_deleted, has_media)
         """
+        lowered = content.lower()
+        
         # Check for deleted messages
-        for pattern in self.DELETED_PATTERNS:
-            if pattern.search(content):
-                return "deleted", True, False
+        if lowered in self.DELETED_MESSAGES:
+            return "deleted", True, False
         
-        # Check for system messages
-        for pattern in self.SYSTEM_PATTERNS:
-            if pattern.search(content):
-                return "system", False, False
+        # Check for system messages (the regex only runs if its word occurs)
+        if any(marker in lowered for marker in self.SYSTEM_MARKERS) or (
+            "removed " in lowered and self.SYSTEM_REMOVED.search(lowered)
+        ):
+            return "system", False, False
         
-        # Check for media
-        for pattern in self.MEDIA_PATTERNS:
-            if pattern.search(content):
-                return "media", False, True
+        # Check for media; every marker contains one of the two sentinels
+        if ("omitted" in lowered or "attached" in lowered) and any(
+            marker in lowered for marker in self.MEDIA_MARKERS
+        ):
+            return "media", False, True
         
         return "text", False, False
     
@@ -206,16 +309,39 @@ class WhatsAppParser:
     
     def get_time_range(self) -> Tuple[Optional[datetime], Optional[datetime]]:
         """Get start and end timestamps of the chat"""
-        if not self.messages:
-            return None, None
-        return self.messages[0].timestamp, self.messages[-1].timestamp
+        return self.start_timestamp, self.end_timestamp
     
     def get_stats(self) -> dict:
         """Get parsing statistics"""
         return {
-            "total_messages": len(self.messages),
+            "total_messages": self.message_count,
             "participants": len(self.participants),
-            "deleted_count": sum(1 for m in self.messages if m.is_deleted),
-            "media_count": sum(1 for m in self.messages if m.has_media),
+            "deleted_count": self.deleted_count,
+            "media_count": self.media_count,
             "parse_errors": len(self.parse_errors),
         }
+
+
+def iter_decoded_chunks(
+    stream: BinaryIO,
+    encoding: str = "utf-8",
+    chunk_size: int = 1 << 20,
+) -> Iterator[str]:
+    """
+    Incrementally decode a binary stream into chunks of whole lines
+    
+    Each chunk ends just before a newline (the newline itself is dropped).
+    Raises UnicodeDecodeError as soon as an undecodable chunk is reached.
+    """
+    chunks = iter(lambda: stream.read(chunk_size), b"")
+    tail = ""
+    for text in codecs.iterdecode(chunks, encoding):
+        text = tail + text
+        cut = text.rfind('\n')
+        if cut < 0:
+            tail = text
+            continue
+        tail = text[cut + 1:]
+        yield text[:cut]
+    if tail:
+        yield tail
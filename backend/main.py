@@ -2,20 +2,32 @@
 ShadowTrace Backend - FastAPI Application
 Forensic chat reconstruction system with AI-powered analysis
 """
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.routers import chat, analysis
-from app.database import engine, Base
+from app.database import sync_engine, Base
 from app.models import ChatSession, Message, Gap, Inference  # noqa: F401
+from app.services.ai_inferencer import close_inferencer
 
 # Create database tables
-Base.metadata.create_all(bind=engine)
+Base.metadata.create_all(bind=sync_engine)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Close the Gemini connection pool on shutdown"""
+    yield
+    await close_inferencer()
+
 
 app = FastAPI(
     title="ShadowTrace API",
     description="Forensic chat reconstruction system with AI-powered gap inference",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
 # CORS configuration
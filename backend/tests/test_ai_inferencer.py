@@ -0,0 +1,562 @@
+"""
+Unit tests for the AI inferencer (Gemini requests go to stub clients)
+"""
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import orjson
+import pytest
+from google.api_core import exceptions as api_exceptions
+
+from app.services.gap_detector import DetectedGap
+from app.services.ai_inferencer import (
+    GeminiInferencer,
+    PersistentInferenceCache,
+    SemanticInferenceCache,
+    TokenBucket,
+)
+
+
+ANSWER = {"predicted_intent": "Konfirmasi jadwal", "confidence_score": 0.4, "hallucination_flags": ["INFERENCE_BASED"]}
+
+
+def make_gap(seq: int, content: str = "jadi besok jam berapa?") -> DetectedGap:
+    """Gap between messages seq-1 and seq; the prompt depends only on content"""
+    return DetectedGap(
+        before_seq=seq - 1,
+        after_seq=seq,
+        before_timestamp=None,
+        after_timestamp=None,
+        time_gap_seconds=5400,
+        detection_type="time_anomaly",
+        suspicion_score=0.6,
+        suspicion_reasons=["Jeda waktu tidak biasa"],
+        context_before=[{"sequence": seq - 1, "sender": "Alice", "content": content, "timestamp": "t"}],
+        context_after=[{"sequence": seq, "sender": "Bob", "content": "oke", "timestamp": "t"}],
+    )
+
+
+def make_context(count: int, content: str = "pesan biasa tentang rencana minggu ini") -> list:
+    """Transcript of count alternating messages"""
+    return [
+        {"sequence": i, "sender": "Alice" if i % 2 else "Bob", "content": content, "timestamp": "t"}
+        for i in range(1, count + 1)
+    ]
+
+
+def batch_reply(prompt: str) -> str:
+    """Answer every GAP_n section of a batched prompt"""
+    ids = re.findall(r"^## (GAP_\d+)$", prompt, re.MULTILINE)
+    return orjson.dumps({"results": [dict(ANSWER, id=gap_id) for gap_id in ids]}).decode()
+
+
+def gaps_in(prompt: str) -> int:
+    """Number of gap sections in a prompt"""
+    return len(re.findall(r"^### \[GAP TERDETEKSI\]$", prompt, re.MULTILINE))
+
+
+class StubResponse:
+    """Minimal stand-in for a Gemini response"""
+    
+    def __init__(self, text: str):
+        self.text = text
+        self.parts = [text] if text else []
+
+
+class StubClient:
+    """
+    Stand-in for a GenerativeModel that records prompts
+    
+    Each reply is a string, a callable taking the prompt, or an exception
+    to raise; once the scripted replies run out, `default` is used.
+    """
+    
+    def __init__(self, *replies, default=None):
+        self.replies = list(replies)
+        self.default = orjson.dumps(ANSWER).decode() if default is None else default
+        self.prompts = []
+    
+    def generate_content(self, prompt, generation_config=None):
+        self.prompts.append(prompt)
+        reply = self.replies.pop(0) if self.replies else self.default
+        if callable(reply):
+            reply = reply(prompt)
+        if isinstance(reply, Exception):
+            raise reply
+        return StubResponse(reply)
+    
+    async def generate_content_async(self, prompt, generation_config=None, stream=False):
+        response = self.generate_content(prompt, generation_config)
+        return StubStream(response.text) if stream else response
+
+
+class StubStream:
+    """Streamed response yielding the reply in small chunks"""
+    
+    def __init__(self, text: str, size: int = 7):
+        self.chunks = [StubResponse(text[i:i + size]) for i in range(0, len(text), size)]
+    
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+class StubGenai:
+    """Stand-in for the genai module's context caching API"""
+    
+    def __init__(self, fail: bool = False, delay: float = 0):
+        self.fail = fail
+        self.delay = delay
+        self.created = []
+        self.caching = SimpleNamespace(CachedContent=SimpleNamespace(create=self._create))
+        self.GenerativeModel = SimpleNamespace(from_cached_content=self._from_cached_content)
+    
+    def _create(self, **kwargs):
+        time.sleep(self.delay)
+        self.created.append(kwargs)
+        if self.fail:
+            raise RuntimeError("429 quota exceeded for cached content")
+        return f"cachedContents/{len(self.created)}"
+    
+    def _from_cached_content(self, cached, **kwargs):
+        return StubClient()
+
+
+@pytest.fixture
+def gemini():
+    """GeminiInferencer without retry delays; tests assign its stub client"""
+    inferencer = GeminiInferencer(api_key="test-key")
+    inferencer.BASE_DELAY = inferencer.SERVER_ERROR_DELAY = 0
+    return inferencer
+
+
+class TestResponseCache:
+    """Test suite for the exact-match response cache"""
+    
+    def test_identical_prompt_is_served_from_cache(self, gemini):
+        """A repeated prompt skips the API but is anchored to its own gap"""
+        gemini._client = StubClient()
+        
+        first = gemini.infer_gap(make_gap(3))
+        second = gemini.infer_gap(make_gap(10))
+        
+        assert len(gemini._client.prompts) == 1
+        assert second.predicted_intent == first.predicted_intent
+        assert [a["sequence"] for a in second.context_anchors] == [9, 10]
+    
+    def test_fallback_is_not_cached(self, gemini):
+        """Failed calls fall back to the mock and are asked again next time"""
+        gemini._client = StubClient(PermissionError("403 forbidden"))
+        
+        failed = gemini.infer_gap(make_gap(3))
+        retried = gemini.infer_gap(make_gap(3))
+        
+        assert "GEMINI_API_FALLBACK" in failed.hallucination_flags
+        assert "GEMINI_API_FALLBACK" not in retried.hallucination_flags
+        assert len(gemini._client.prompts) == 2
+    
+    def test_preloaded_transcript_keeps_cache_keys(self, gemini):
+        """Keys from the digests hashed at preload match freshly hashed ones"""
+        context = make_context(600)
+        suffix = gemini._build_gap_suffix(make_gap(3))
+        fresh = gemini._response_cache_key(suffix, gemini._transcript(context))
+        
+        gemini._genai = None  # CachedContent creation fails; keys must not care
+        gemini.preload_transcript(context)
+        preloaded = gemini._transcript(context)
+        
+        assert preloaded is gemini._transcript_prefixes[id(context)]
+        assert gemini._response_cache_key(suffix, preloaded) == fresh
+    
+    def test_transcript_is_never_sent_inline(self, gemini):
+        """Without a CachedContent only the gap section is sent"""
+        gemini._client = StubClient()
+        gemini._genai = None  # CachedContent creation fails
+        
+        gemini.infer_gap(make_gap(3, "kecil"), make_context(5))
+        gemini.infer_gap(make_gap(3, "besar"), make_context(600))
+        
+        assert all("TRANSKRIP LENGKAP" not in prompt for prompt in gemini._client.prompts)
+
+
+class TestPrefixCache:
+    """Test suite for CachedContent creation of transcript prefixes"""
+    
+    def test_concurrent_misses_create_one_cache(self, gemini):
+        """Requests racing on a new transcript share a single CachedContent"""
+        gemini._genai = StubGenai(delay=0.05)
+        transcript = gemini._transcript(make_context(600))
+        
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            models = list(executor.map(lambda _: gemini._cached_prefix_model(transcript), range(8)))
+        
+        assert len(gemini._genai.created) == 1
+        assert all(model is models[0] for model in models)
+    
+    def test_failed_creation_is_retried_soon(self, gemini):
+        """A failed creation is not remembered for the whole cache TTL"""
+        gemini._genai = StubGenai(fail=True)
+        gemini.PREFIX_CACHE_RETRY_SECONDS = 0.05
+        transcript = gemini._transcript(make_context(600))
+        
+        assert gemini._cached_prefix_model(transcript) is None
+        assert gemini._cached_prefix_model(transcript) is None
+        assert len(gemini._genai.created) == 1
+        
+        time.sleep(0.1)
+        gemini._genai.fail = False
+        assert gemini._cached_prefix_model(transcript) is not None
+        assert len(gemini._genai.created) == 2
+
+
+class TestRetryDelay:
+    """Test suite for retryable error classification"""
+    
+    @pytest.mark.parametrize("error", [
+        api_exceptions.ResourceExhausted("Resource has been exhausted"),
+        api_exceptions.ServiceUnavailable("The model is overloaded"),
+        api_exceptions.DeadlineExceeded("Deadline Exceeded"),
+        RuntimeError("Rate limit exceeded, try again later"),
+        RuntimeError("HTTP 503 from upstream"),
+        TimeoutError(),
+    ])
+    def test_transient_errors_are_retried(self, gemini, error):
+        """Rate limits, server errors and timeouts get a backoff delay"""
+        assert gemini._retry_delay(error, 0) is not None
+    
+    @pytest.mark.parametrize("error", [
+        api_exceptions.InvalidArgument("Failed to generate: prompt has 1500 tokens over the rate"),
+        api_exceptions.PermissionDenied("API key not valid"),
+        ValueError("Response blocked by safety filters"),
+        RuntimeError("moderate content could not be separated"),
+    ])
+    def test_other_errors_are_not_retried(self, gemini, error):
+        """A status code is trusted over the message; loose substrings do not match"""
+        assert gemini._retry_delay(error, 0) is None
+
+
+class TestBatching:
+    """Test suite for several gaps sharing one Gemini request"""
+    
+    def test_results_are_matched_by_id(self, gemini):
+        """Answers are demultiplexed by their GAP_n id, not their position"""
+        reply = {"results": [
+            dict(ANSWER, id="GAP_2", predicted_intent="kedua"),
+            dict(ANSWER, id="GAP_1", predicted_intent="pertama"),
+        ]}
+        gemini._client = StubClient(orjson.dumps(reply).decode())
+        
+        results = gemini.infer_gaps_batched([make_gap(2, "satu"), make_gap(4, "dua")])
+        
+        assert len(gemini._client.prompts) == 1
+        assert [r.predicted_intent for r in results] == ["pertama", "kedua"]
+        assert [a["sequence"] for a in results[1].context_anchors] == [3, 4]
+    
+    def test_partial_reply_retries_missing_gaps(self, gemini):
+        """Gaps left out of a reply are asked again as one smaller batch"""
+        partial = orjson.dumps({"results": [dict(ANSWER, id="GAP_2")]}).decode()
+        gemini._client = StubClient(partial, default=batch_reply)
+        
+        results = gemini.infer_gaps_batched([make_gap(2 * i + 2, f"gap {i}") for i in range(3)])
+        
+        assert [gaps_in(p) for p in gemini._client.prompts] == [3, 2]
+        assert all(r.predicted_intent == ANSWER["predicted_intent"] for r in results)
+    
+    def test_cached_gaps_are_left_out(self, gemini):
+        """Only gaps without a cached result are sent"""
+        gemini._client = StubClient(default=batch_reply)
+        known = [make_gap(2, "gap A"), make_gap(4, "gap B")]
+        gemini.infer_gaps_batched(known)
+        
+        gemini.infer_gaps_batched(known + [make_gap(6, "gap C"), make_gap(8, "gap D")])
+        
+        assert [gaps_in(p) for p in gemini._client.prompts] == [2, 2]
+        assert "gap C" in gemini._client.prompts[1] and "gap A" not in gemini._client.prompts[1]
+
+
+class TestBatchRetries:
+    """Test suite for retrying and splitting failed batch requests"""
+    
+    def test_exhausted_rate_limit_does_not_split(self, gemini):
+        """A batch that stays rate limited falls back after MAX_RETRIES requests"""
+        quota = api_exceptions.ResourceExhausted("Resource has been exhausted")
+        gemini._client = StubClient(default=quota)
+        
+        results = gemini.infer_gaps_batched([make_gap(2 * i + 2, f"gap {i}") for i in range(8)])
+        
+        assert len(gemini._client.prompts) == gemini.MAX_RETRIES
+        assert all("GEMINI_API_FALLBACK" in r.hallucination_flags for r in results)
+    
+    @pytest.mark.asyncio
+    async def test_exhausted_rate_limit_does_not_split_async(self, gemini):
+        """The async path sends no more requests than the sync one"""
+        quota = api_exceptions.ResourceExhausted("Resource has been exhausted")
+        gemini._client = StubClient(default=quota)
+        
+        results = await gemini.infer_gaps_batched_async([make_gap(2 * i + 2, f"gap {i}") for i in range(8)])
+        
+        assert len(gemini._client.prompts) == gemini.MAX_RETRIES
+        assert all("GEMINI_API_FALLBACK" in r.hallucination_flags for r in results)
+    
+    def test_no_sleep_after_last_attempt(self, gemini, monkeypatch):
+        """Backoff only happens between attempts"""
+        sleeps = []
+        monkeypatch.setattr("app.services.ai_inferencer.time.sleep", sleeps.append)
+        gemini._client = StubClient(default=api_exceptions.ServiceUnavailable("overloaded"))
+        
+        gemini.infer_gaps_batched([make_gap(2), make_gap(4, "lain")])
+        
+        assert len(sleeps) == gemini.MAX_RETRIES - 1
+    
+    def test_unparseable_reply_is_bisected(self, gemini):
+        """A reply without usable results is retried as two halves"""
+        gemini._client = StubClient("bukan json", default=batch_reply)
+        
+        results = gemini.infer_gaps_batched([make_gap(2 * i + 2, f"gap {i}") for i in range(4)])
+        
+        assert [gaps_in(p) for p in gemini._client.prompts] == [4, 2, 2]
+        assert all(r.predicted_intent == ANSWER["predicted_intent"] for r in results)
+    
+    def test_blocked_reply_is_bisected(self, gemini):
+        """A blocked batch is split; the halves may pass the filters"""
+        gemini._client = StubClient("", default=batch_reply)
+        
+        gemini.infer_gaps_batched([make_gap(2 * i + 2, f"gap {i}") for i in range(4)])
+        
+        assert [gaps_in(p) for p in gemini._client.prompts] == [4, 2, 2]
+
+
+class TestPersistentInferenceCache:
+    """Test suite for the context-keyed (optionally SQLite-backed) cache"""
+    
+    def test_normalized_context_hits(self, gemini):
+        """Case and whitespace differences still hit, anchored to the new gap"""
+        gemini._client = StubClient()
+        cache = PersistentInferenceCache(gemini)
+        
+        cache.infer_gap(make_gap(3, "Jadi besok jam berapa?"))
+        hit = cache.infer_gap(make_gap(20, "jadi  BESOK jam berapa?"))
+        
+        assert len(gemini._client.prompts) == 1
+        assert cache.HIT_FLAG in hit.hallucination_flags
+        assert [a["sequence"] for a in hit.context_anchors] == [19, 20]
+    
+    def test_results_survive_restart(self, gemini, tmp_path):
+        """A second cache on the same file answers without the API"""
+        path = str(tmp_path / "inferences.sqlite")
+        gemini._client = StubClient()
+        PersistentInferenceCache(gemini, path=path).infer_gap(make_gap(3))
+        
+        reopened = PersistentInferenceCache(gemini, path=path)
+        hit = reopened.infer_gap(make_gap(3))
+        
+        assert len(gemini._client.prompts) == 1
+        assert hit.predicted_intent == ANSWER["predicted_intent"]
+        assert reopened.HIT_FLAG in hit.hallucination_flags
+    
+    def test_fallbacks_are_not_stored(self, gemini, tmp_path):
+        """Failed API calls are asked again"""
+        gemini._client = StubClient(PermissionError("403 forbidden"))
+        cache = PersistentInferenceCache(gemini, path=str(tmp_path / "inferences.sqlite"))
+        
+        cache.infer_gap(make_gap(3))
+        retried = cache.infer_gap(make_gap(3))
+        
+        assert len(gemini._client.prompts) == 2
+        assert cache.HIT_FLAG not in retried.hallucination_flags
+    
+    def test_model_change_misses(self, gemini, tmp_path):
+        """Results stored for another model are not reused"""
+        path = str(tmp_path / "inferences.sqlite")
+        gemini._client = StubClient()
+        PersistentInferenceCache(gemini, path=path).infer_gap(make_gap(3))
+        
+        other = GeminiInferencer(api_key="test-key", model="gemini-other")
+        other._client = StubClient()
+        result = PersistentInferenceCache(other, path=path).infer_gap(make_gap(3))
+        
+        assert len(other._client.prompts) == 1
+        assert PersistentInferenceCache.HIT_FLAG not in result.hallucination_flags
+    
+    def test_memory_entries_expire(self, gemini):
+        """The in-process LRU honours the TTL too"""
+        gemini._client = StubClient()
+        cache = PersistentInferenceCache(gemini, ttl=0)
+        
+        cache.infer_gap(make_gap(3))
+        result = cache.infer_gap(make_gap(3))
+        
+        assert cache.HIT_FLAG not in result.hallucination_flags
+    
+    @pytest.mark.asyncio
+    async def test_async_batches_use_the_file(self, gemini, tmp_path):
+        """The async path reads and writes SQLite off the event loop"""
+        path = str(tmp_path / "inferences.sqlite")
+        gemini._client = StubClient(default=batch_reply)
+        gaps = [make_gap(2, "gap A"), make_gap(4, "gap B")]
+        await PersistentInferenceCache(gemini, path=path).infer_gaps_batched_async(gaps)
+        
+        results = await PersistentInferenceCache(gemini, path=path).infer_gaps_batched_async(gaps)
+        
+        assert len(gemini._client.prompts) == 1
+        assert all(PersistentInferenceCache.HIT_FLAG in r.hallucination_flags for r in results)
+
+
+class TestSemanticInferenceCache:
+    """Test suite for the near-duplicate gap cache"""
+    
+    def test_similar_gap_hits_with_its_own_anchors(self, gemini):
+        """A near-duplicate is served from the cache but points at its own messages"""
+        gemini._client = StubClient()
+        cache = SemanticInferenceCache(gemini, threshold=0.8)
+        
+        cache.infer_gap(make_gap(3, "jadi besok kita ketemu jam berapa di kantor?"))
+        hit = cache.infer_gap(make_gap(40, "jadi besok kita ketemu jam berapa di kantor ya?"))
+        
+        assert len(gemini._client.prompts) == 1
+        assert cache.HIT_FLAG in hit.hallucination_flags
+        assert [a["sequence"] for a in hit.context_anchors] == [39, 40]
+    
+    def test_different_gap_misses(self, gemini):
+        """Unrelated context goes to the wrapped inferencer"""
+        gemini._client = StubClient()
+        cache = SemanticInferenceCache(gemini)
+        
+        cache.infer_gap(make_gap(3, "jadi besok kita ketemu jam berapa di kantor?"))
+        miss = cache.infer_gap(make_gap(40, "transfer uangnya sudah masuk rekening"))
+        
+        assert len(gemini._client.prompts) == 2
+        assert cache.HIT_FLAG not in miss.hallucination_flags
+    
+    def test_concurrent_lookups_and_stores(self, gemini):
+        """Threads may look up and store at the same time"""
+        gemini._client = StubClient()
+        cache = SemanticInferenceCache(gemini)
+        cache.MAX_ENTRIES = 16
+        gaps = [make_gap(2 * i + 2, f"topik nomor {i} " * (i % 7 + 1)) for i in range(200)]
+        
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(cache.infer_gap, gaps))
+        
+        assert len(results) == len(gaps)
+        assert len(cache._entries) <= cache.MAX_ENTRIES
+
+
+class TestTokenBucket:
+    """Test suite for client-side request pacing"""
+    
+    def test_zero_rate_never_waits(self):
+        """A rate of 0 disables pacing"""
+        bucket = TokenBucket(0)
+        assert [bucket._reserve() for _ in range(100)] == [0.0] * 100
+    
+    def test_burst_then_paced(self):
+        """Up to capacity requests go at once; later ones are spaced by 1/rate"""
+        bucket = TokenBucket(rate=10, capacity=2)
+        waits = [bucket._reserve() for _ in range(4)]
+        
+        assert waits[:2] == [0.0, 0.0]
+        assert waits[2] == pytest.approx(0.1, abs=0.02)
+        assert waits[3] == pytest.approx(0.2, abs=0.02)
+    
+    @pytest.mark.asyncio
+    async def test_async_acquire_waits_for_token(self):
+        """acquire_async sleeps until the reserved token is due"""
+        bucket = TokenBucket(rate=20)
+        start = time.monotonic()
+        for _ in range(3):
+            await bucket.acquire_async()
+        
+        assert time.monotonic() - start >= 0.09
+
+
+class TestStreaming:
+    """Test suite for streamed answers and their partial fields"""
+    
+    def test_only_top_level_fields_complete(self, gemini):
+        """Key names quoted inside strings or nested objects are not fields"""
+        partial = (
+            '{"predicted_intent": "Konfirmasi", '
+            '"reasoning": "tertulis \\"confidence_score\\": 0.9 di pesan", '
+            '"meta": {"predicted_sender": "Bob"}, '
+            '"confidence_score": 0.3'
+        )
+        
+        fields = gemini._completed_fields(partial)
+        
+        assert fields == {
+            "predicted_intent": "Konfirmasi",
+            "reasoning": 'tertulis "confidence_score": 0.9 di pesan',
+        }
+        assert gemini._completed_fields(partial + ",")["confidence_score"] == 0.3
+    
+    def test_unfinished_value_is_left_out(self, gemini):
+        """A string still streaming ends the scan"""
+        fields = gemini._completed_fields('{"predicted_intent": "Kon')
+        assert fields == {}
+    
+    @pytest.mark.asyncio
+    async def test_stream_yields_partials_then_final(self, gemini):
+        """Partial results are flagged; the last result is final and cached"""
+        gemini._client = StubClient()
+        
+        results = [r async for r in gemini.infer_gap_stream(make_gap(3))]
+        
+        assert len(results) > 1
+        assert all("PARTIAL_RESULT" in r.hallucination_flags for r in results[:-1])
+        assert "PARTIAL_RESULT" not in results[-1].hallucination_flags
+        assert results[-1].confidence_score == ANSWER["confidence_score"]
+        assert gemini.infer_gap(make_gap(3)).confidence_score == ANSWER["confidence_score"]
+        assert len(gemini._client.prompts) == 1
+    
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("wrapper", [SemanticInferenceCache, PersistentInferenceCache])
+    async def test_cache_wrappers_pass_the_stream_through(self, gemini, wrapper):
+        """A miss streams partials from the wrapped inferencer; a hit yields the cached result"""
+        gemini._client = StubClient()
+        cache = wrapper(gemini)
+        
+        streamed = [r async for r in cache.infer_gap_stream(make_gap(3))]
+        hit = [r async for r in cache.infer_gap_stream(make_gap(20))]
+        
+        assert any("PARTIAL_RESULT" in r.hallucination_flags for r in streamed)
+        assert len(hit) == 1
+        assert cache.HIT_FLAG in hit[0].hallucination_flags
+        assert [a["sequence"] for a in hit[0].context_anchors] == [19, 20]
+        assert len(gemini._client.prompts) == 1
+
+
+class TestAclose:
+    """Test suite for releasing genai's service clients"""
+    
+    @pytest.mark.asyncio
+    async def test_failing_transport_does_not_stop_shutdown(self, gemini, monkeypatch):
+        """A client that fails to close is logged and the rest are still closed"""
+        from google.generativeai import client as genai_client
+        
+        closed = []
+        
+        def broken():
+            raise RuntimeError("channel gone")
+        
+        clients = {
+            "generative": SimpleNamespace(transport=SimpleNamespace(close=broken)),
+            "cache": SimpleNamespace(transport=SimpleNamespace(close=lambda: closed.append("cache"))),
+        }
+        monkeypatch.setattr(genai_client, "_client_manager", SimpleNamespace(clients=clients))
+        
+        await gemini.aclose()
+        
+        assert closed == ["cache"]
+        assert clients == {}
+    
+    @pytest.mark.asyncio
+    async def test_missing_registry_is_tolerated(self, gemini, monkeypatch):
+        """Without the private registry aclose only drops the shared models"""
+        from google.generativeai import client as genai_client
+        
+        monkeypatch.delattr(genai_client, "_client_manager")
+        
+        await gemini.aclose()
@@ -0,0 +1,39 @@
+-- Bring a database whose tables were created by an older SQLAlchemy
+-- create_all up to date with the current models and schema.sql
+-- (create_all never alters tables that already exist). Safe to re-run.
+
+BEGIN;
+
+-- Server-side defaults
+ALTER TABLE chat_sessions
+    ALTER COLUMN created_at SET DEFAULT timezone('utc', now()),
+    ALTER COLUMN updated_at SET DEFAULT timezone('utc', now());
+ALTER TABLE messages
+    ALTER COLUMN id SET DEFAULT gen_random_uuid(),
+    ALTER COLUMN created_at SET DEFAULT timezone('utc', now());
+ALTER TABLE gaps ALTER COLUMN created_at SET DEFAULT timezone('utc', now());
+ALTER TABLE inferences ALTER COLUMN created_at SET DEFAULT timezone('utc', now());
+
+-- Indexes
+CREATE INDEX IF NOT EXISTS idx_messages_session_seq ON messages(session_id, sequence_number);
+CREATE INDEX IF NOT EXISTS idx_messages_session_stats ON messages(session_id, sender) INCLUDE (is_deleted, has_media);
+CREATE INDEX IF NOT EXISTS idx_gaps_session_seq ON gaps(session_id, before_message_seq);
+CREATE INDEX IF NOT EXISTS idx_gaps_suspicion ON gaps(session_id, suspicion_score);
+CREATE INDEX IF NOT EXISTS idx_inferences_gap ON inferences(gap_id);
+CREATE INDEX IF NOT EXISTS idx_inferences_confidence ON inferences(confidence_score);
+
+-- Let PostgreSQL cascade session/gap deletes to their children
+ALTER TABLE messages
+    DROP CONSTRAINT IF EXISTS messages_session_id_fkey,
+    ADD CONSTRAINT messages_session_id_fkey
+        FOREIGN KEY (session_id) REFERENCES chat_sessions(id) ON DELETE CASCADE;
+ALTER TABLE gaps
+    DROP CONSTRAINT IF EXISTS gaps_session_id_fkey,
+    ADD CONSTRAINT gaps_session_id_fkey
+        FOREIGN KEY (session_id) REFERENCES chat_sessions(id) ON DELETE CASCADE;
+ALTER TABLE inferences
+    DROP CONSTRAINT IF EXISTS inferences_gap_id_fkey,
+    ADD CONSTRAINT inferences_gap_id_fkey
+        FOREIGN KEY (gap_id) REFERENCES gaps(id) ON DELETE CASCADE;
+
+COMMIT;
@@ -17,8 +17,8 @@ CREATE TABLE IF NOT EXISTS chat_sessions (
     detected_gaps INTEGER DEFAULT 0,
     status VARCHAR(50) DEFAULT 'pending',
     error_message TEXT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP DEFAULT timezone('utc', now()),
+    updated_at TIMESTAMP DEFAULT timezone('utc', now())
 );
 
 -- Messages table
@@ -34,12 +34,14 @@ CREATE TABLE IF NOT EXISTS messages (
     word_count INTEGER DEFAULT 0,
     has_media BOOLEAN DEFAULT FALSE,
     reply_to_sequence INTEGER,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP DEFAULT timezone('utc', now())
 );
 
 -- Create index for faster message queries
 CREATE INDEX IF NOT EXISTS idx_messages_session_seq ON messages(session_id, sequence_number);
-CREATE INDEX IF NOT EXISTS idx_messages_sender ON messages(session_id, sender);
+-- Covering index for per-sender stats (index-only scan); supersedes idx_messages_sender
+DROP INDEX IF EXISTS idx_messages_sender;
+CREATE INDEX IF NOT EXISTS idx_messages_session_stats ON messages(session_id, sender) INCLUDE (is_deleted, has_media);
 
 -- Gaps table
 CREATE TABLE IF NOT EXISTS gaps (
@@ -54,11 +56,11 @@ CREATE TABLE IF NOT EXISTS gaps (
     suspicion_reasons TEXT, -- JSON array
     context_before TEXT, -- JSON array
     context_after TEXT, -- JSON array
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP DEFAULT timezone('utc', now())
 );
 
 -- Create index for gaps
-CREATE INDEX IF NOT EXISTS idx_gaps_session ON gaps(session_id);
+CREATE INDEX IF NOT EXISTS idx_gaps_session_seq ON gaps(session_id, before_message_seq);
 CREATE INDEX IF NOT EXISTS idx_gaps_suspicion ON gaps(session_id, suspicion_score);
 
 -- Inferences table
@@ -74,7 +76,7 @@ CREATE TABLE IF NOT EXISTS inferences (
     reasoning TEXT,
     hallucination_flags TEXT, -- JSON array
     verified VARCHAR(20) DEFAULT 'pending',
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP DEFAULT timezone('utc', now())
 );
 
 -- Create index for inferences
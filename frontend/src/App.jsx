@@ -5,6 +5,9 @@ import ChatView from './components/ChatView'
 import Toast from './components/Toast'
 
 const API_BASE = '/api'
+const ANALYSIS_POLL_MS = 1500
+// Give up waiting after 10 minutes; the analysis keeps running server-side
+const ANALYSIS_MAX_POLLS = 400
 
 function App() {
     const [sessions, setSessions] = useState([])
@@ -79,15 +82,27 @@ function App() {
                 const err = await res.json().catch(() => ({}))
                 throw new Error(err.detail || `HTTP ${res.status}`)
             }
-            const result = await res.json()
+            // Analysis runs in the background; poll its status (no messages)
+            // until it finishes or the attempts run out
+            let updated
+            let polls = 0
+            do {
+                if (polls++ >= ANALYSIS_MAX_POLLS) {
+                    throw new Error('waktu tunggu habis, analisis masih berjalan di server')
+                }
+                await new Promise((resolve) => setTimeout(resolve, ANALYSIS_POLL_MS))
+                const statusRes = await fetch(`${API_BASE}/sessions/${sessionId}/status`, {
+                    signal: AbortSignal.timeout(ANALYSIS_POLL_MS * 10),
+                })
+                if (!statusRes.ok) throw new Error(`HTTP ${statusRes.status}`)
+                updated = await statusRes.json()
+            } while (updated.status === 'processing')
             await fetchSessions()
-            const sessionRes = await fetch(`${API_BASE}/sessions/${sessionId}`)
-            const updated = await sessionRes.json()
             setSelectedSession(updated)
-            addToast(
-                `Analisis selesai! ${result.gaps_detected} gap, ${result.inferences_generated} inferensi AI.`,
-                'success'
-            )
+            if (updated.status === 'error') {
+                throw new Error(updated.error_message || 'unknown error')
+            }
+            addToast(`Analisis selesai! ${updated.detected_gaps} gap terdeteksi.`, 'success')
         } catch (err) {
             addToast(`Analisis gagal: ${err.message}`, 'error')
         } finally {